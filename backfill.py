@@ -0,0 +1,174 @@
+import datetime
+import json
+import os
+import time
+
+from common_utils import format_calculated_date
+from config import BACKFILL_POLL_SECONDS, GEMINI_MODEL_ID
+from discord_sender import broadcast_to_discord, get_webhook_targets
+from gemini_handler import (
+    build_gemini_prompt,
+    get_financial_summary_from_gemini,
+    get_gemini_client,
+)
+
+# バッチジョブがこれ以上進まない状態
+_TERMINAL_JOB_STATES = {
+    "JOB_STATE_SUCCEEDED",
+    "JOB_STATE_PARTIALLY_SUCCEEDED",
+    "JOB_STATE_FAILED",
+    "JOB_STATE_CANCELLED",
+    "JOB_STATE_EXPIRED",
+}
+
+
+def iter_dates(start: datetime.date, end: datetime.date) -> list[datetime.date]:
+    """start から end まで (両端を含む) の日付を順に返す関数。"""
+    return [
+        start + datetime.timedelta(days=offset)
+        for offset in range((end - start).days + 1)
+    ]
+
+
+def write_batch_requests(dates: list[datetime.date], path: str) -> list[str]:
+    """日付ごとに1件のバッチリクエストをJSONLファイルに書き出し、キーの一覧を返す関数。
+
+    キーは ISO形式の日付 (YYYY-MM-DD)。リクエスト本体は build_gemini_prompt で作る。
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    keys = []
+    with open(path, "w", encoding="utf-8") as f:
+        for date in dates:
+            key = date.isoformat()
+            request = {
+                "contents": [
+                    {
+                        "role": "user",
+                        "parts": [{"text": build_gemini_prompt(format_calculated_date(date))}],
+                    }
+                ],
+                "tools": [{"google_search": {}}],
+            }
+            f.write(json.dumps({"key": key, "request": request}, ensure_ascii=False) + "\n")
+            keys.append(key)
+    print(f"バッチリクエストを {len(keys)} 件書き出しました: {path}")
+    return keys
+
+
+def _response_text(response: dict) -> str | None:
+    """GenerateContentResponse (JSON) から本文テキストを取り出す。"""
+    for candidate in response.get("candidates") or []:
+        parts = (candidate.get("content") or {}).get("parts") or []
+        text = "".join(part.get("text", "") for part in parts)
+        if text:
+            return text
+    return None
+
+
+def parse_batch_results(lines: list[str]) -> dict[str, str | None]:
+    """バッチ結果のJSONLを {キー: 本文テキスト} に変換する関数。エラーの行は None になる。"""
+    results: dict[str, str | None] = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        key = item.get("key")
+        if key is None:
+            continue
+        if item.get("error"):
+            print(f"バッチ結果 {key} はエラーでした: {item['error']}")
+            results[key] = None
+            continue
+        results[key] = _response_text(item.get("response") or {})
+    return results
+
+
+class GeminiBatchRunner:
+    """JSONLファイルをGemini APIのバッチジョブとして実行するクラス。"""
+
+    def __init__(self, poll_seconds: float = BACKFILL_POLL_SECONDS) -> None:
+        self.poll_seconds = poll_seconds
+
+    def run(self, path: str) -> dict[str, str | None]:
+        client = get_gemini_client()
+        if not client:
+            raise RuntimeError("Geminiクライアントが初期化されていないため、バッチジョブを実行できません。")
+        from google.genai.types import UploadFileConfig  # 関数内インポート
+
+        uploaded = client.files.upload(
+            file=path,
+            config=UploadFileConfig(
+                display_name=os.path.basename(path), mime_type="jsonl"
+            ),
+        )
+        job = client.batches.create(
+            model=GEMINI_MODEL_ID,
+            src=uploaded.name,
+            config={"display_name": f"backfill-{os.path.basename(path)}"},
+        )
+        print(f"バッチジョブを作成しました: {job.name}")
+
+        while job.state.name not in _TERMINAL_JOB_STATES:
+            time.sleep(self.poll_seconds)
+            job = client.batches.get(name=job.name)
+            print(f"バッチジョブの状態: {job.state.name}")
+
+        if job.state.name not in {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"}:
+            raise RuntimeError(f"バッチジョブが完了しませんでした: {job.state.name} {job.error}")
+        content = client.files.download(file=job.dest.file_name)
+        return parse_batch_results(content.decode("utf-8").splitlines())
+
+
+class LocalBatchRunner:
+    """バッチジョブの代わりに、JSONLの各リクエストを手元で1件ずつ実行するクラス。
+
+    テストやバッチAPIが使えない環境向け。generate を差し替えればAPIを呼ばずに動かせる。
+    """
+
+    def __init__(self, generate=get_financial_summary_from_gemini) -> None:
+        self.generate = generate
+
+    def run(self, path: str) -> dict[str, str | None]:
+        results: dict[str, str | None] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                prompt = item["request"]["contents"][0]["parts"][0]["text"]
+                try:
+                    results[item["key"]] = self.generate(prompt)
+                except Exception as e:
+                    print(f"バッチ結果 {item['key']} はエラーでした: {e}")
+                    results[item["key"]] = None
+        return results
+
+
+def run_backfill(
+    start: datetime.date,
+    end: datetime.date,
+    runner,
+    requests_path: str,
+    post: bool = True,
+) -> dict[str, str | None]:
+    """期間内の各日付のサマリーを1つのバッチで生成し、日付順にDiscordへ投稿する関数。"""
+    dates = iter_dates(start, end)
+    if not dates:
+        print("バックフィル対象の日付がありません。")
+        return {}
+    write_batch_requests(dates, requests_path)
+    results = runner.run(requests_path)
+
+    webhook_targets = get_webhook_targets() if post else []
+    for date in dates:
+        summary = results.get(date.isoformat())
+        if not summary:
+            summary = f"ℹ️ {format_calculated_date(date)} の金融市場サマリーは取得できませんでした (バックフィル)。"
+        if webhook_targets:
+            broadcast_to_discord(summary, username="ナカヤマ", targets=webhook_targets)
+        else:
+            print(f"\n--- {date.isoformat()} のサマリー (コンソール表示のみ) ---")
+            print(summary)
+    return results
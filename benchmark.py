@@ -0,0 +1,290 @@
+"""ネットワークを使わずに性能を計測するベンチマーク。
+
+Discord Webhook を模したローカルHTTPサーバー、遅延を設定できる偽のGeminiクライアント、
+偽のyfinanceデータを使い、以下を計測して benchmark_baseline.json と比較する。
+
+- main_logic のエンドツーエンド所要時間 (Gemini版 / yfinanceフォールバック版)
+- DiscordWebhookSender のスループット (429応答を含む)
+
+使い方:
+    python benchmark.py                   # 計測してベースラインと比較 (悪化時は終了コード1)
+    python benchmark.py --update-baseline # 計測結果をベースラインとして保存
+"""
+
+import argparse
+import contextlib
+import datetime
+import http.server
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+
+
+class FakeDiscordServer:
+    """Discord Webhook を模したローカルHTTPサーバー。
+
+    latency 秒の遅延の後に応答し、rate_limit_every 件に1件は 429 (retry_after 付き) を返す。
+    ?wait=true の場合はメッセージIDを含むJSONを返す。
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        rate_limit_every: int = 0,
+        retry_after: float = 0.01,
+    ) -> None:
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive を有効にする
+
+            def log_message(self, format, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                with server._lock:
+                    server.request_count += 1
+                    limited = (
+                        server.rate_limit_every
+                        and server.request_count % server.rate_limit_every == 0
+                    )
+                    if limited:
+                        server.rate_limited_count += 1
+                    message_id = str(server.request_count)
+                time.sleep(server.latency)
+                if limited:
+                    body = json.dumps(
+                        {"retry_after": server.retry_after, "global": False}
+                    ).encode()
+                    self.send_response(429)
+                    self.send_header("Retry-After", str(server.retry_after))
+                elif "wait=true" in self.path or self.command == "PATCH":
+                    body = json.dumps({"id": message_id}).encode()
+                    self.send_response(200)
+                else:
+                    body = b""
+                    self.send_response(204)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_POST = _handle
+            do_PATCH = _handle
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def webhook_url(self, index: int = 0) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}/api/webhooks/{index}/token"
+
+    def __enter__(self) -> "FakeDiscordServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _FakeUsage:
+    prompt_token_count = 600
+    candidates_token_count = 400
+    total_token_count = 1000
+
+
+class _FakeResponse:
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.usage_metadata = _FakeUsage()
+
+
+class FakeGeminiClient:
+    """client.models.generate_content / generate_content_stream を模した偽のGeminiクライアント。"""
+
+    def __init__(self, latency: float = 0.0, text: str = "") -> None:
+        self.latency = latency
+        self.text = text or "**ベンチマーク用サマリー**\n- S&P 500: 5,100.00 (前日比 +2.00%)\n"
+        self.models = self
+
+    def generate_content(self, model, contents, config=None):
+        time.sleep(self.latency)
+        return _FakeResponse(self.text)
+
+    def generate_content_stream(self, model, contents, config=None):
+        chunks = self.text.splitlines(keepends=True)
+        for chunk in chunks:
+            time.sleep(self.latency / max(len(chunks), 1))
+            yield _FakeResponse(chunk)
+
+
+def make_fake_download(latency: float = 0.0, days: int = 10):
+    """yf.download の代わりに、遅延の後で全ティッカー分の終値を返す関数を作る。"""
+    import pandas as pd
+
+    def fake_download(tickers, **kwargs):
+        time.sleep(latency)
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        index = pd.date_range(end=datetime.date.today(), periods=days)
+        columns = pd.MultiIndex.from_product([["Close"], tickers])
+        values = [[100.0 + day + i for i in range(len(tickers))] for day in range(days)]
+        return pd.DataFrame(values, index=index, columns=columns)
+
+    return fake_download
+
+
+@contextlib.contextmanager
+def offline_environment(server: FakeDiscordServer, targets: int, gemini_client):
+    """main_logic をネットワークなしで動かすためのパッチをまとめて当てる。"""
+    import discord_sender
+
+    webhook_targets = [
+        discord_sender.WebhookTarget(url=server.webhook_url(i), name=f"bench-{i}")
+        for i in range(targets)
+    ]
+    patches = [
+        patch("main.get_webhook_targets", return_value=webhook_targets),
+        patch("main.GOOGLE_API_KEY", "benchmark" if gemini_client else ""),
+        patch("main.get_gemini_client", return_value=gemini_client),
+        patch("gemini_handler.get_gemini_client", return_value=gemini_client),
+        patch("gemini_handler.GEMINI_CACHE_ENABLED", False),
+        patch("yfinance_handler.YFINANCE_CACHE_ENABLED", False),
+        patch("main.METRICS_JSONL_PATH", ""),
+        patch("main.DELIVERY_LEDGER_ENABLED", False),
+        patch("main.get_gemini_circuit_breaker", return_value=MagicMock()),
+        patch("main.METRICS_PROMETHEUS_PATH", ""),
+        # 送信オブジェクトはベンチマークごとに作り直す
+        patch("discord_sender._default_sender", None),
+    ]
+    with contextlib.ExitStack() as stack:
+        for p in patches:
+            stack.enter_context(p)
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+        yield
+
+
+def _median_seconds(func, repeat: int) -> float:
+    durations = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started_at)
+    return statistics.median(durations)
+
+
+def bench_main_logic_gemini(repeat: int) -> float:
+    """Gemini版のエンドツーエンド所要時間 (秒、中央値)。"""
+    import main
+
+    with FakeDiscordServer(latency=0.02) as server, offline_environment(
+        server, targets=5, gemini_client=FakeGeminiClient(latency=0.2)
+    ), patch("yfinance.download", make_fake_download(latency=0.1)):
+        return _median_seconds(lambda: main.main_logic(hedged=False, streaming=False), repeat)
+
+
+def bench_main_logic_fallback(repeat: int) -> float:
+    """yfinanceフォールバック版のエンドツーエンド所要時間 (秒、中央値)。"""
+    import main
+
+    with FakeDiscordServer(latency=0.02) as server, offline_environment(
+        server, targets=5, gemini_client=None
+    ), patch("yfinance.download", make_fake_download(latency=0.1)):
+        return _median_seconds(lambda: main.main_logic(hedged=False, streaming=False), repeat)
+
+
+def bench_sender_throughput(messages: int) -> float:
+    """429応答を含む状況での DiscordWebhookSender のスループット (件/秒)。"""
+    from discord_sender import DiscordWebhookSender
+
+    with FakeDiscordServer(latency=0.005, rate_limit_every=10) as server:
+        sender = DiscordWebhookSender()
+        url = server.webhook_url()
+        with contextlib.redirect_stdout(io.StringIO()):
+            started_at = time.perf_counter()
+            for i in range(messages):
+                sender.send(f"ベンチマーク {i}", url=url)
+            elapsed = time.perf_counter() - started_at
+        sender.close()
+    return messages / elapsed
+
+
+# 計測名 -> (計測関数, 大きいほど良いか)
+BENCHMARKS = {
+    "main_logic_gemini_seconds": (lambda: bench_main_logic_gemini(repeat=5), False),
+    "main_logic_fallback_seconds": (lambda: bench_main_logic_fallback(repeat=5), False),
+    "sender_throughput_messages_per_second": (lambda: bench_sender_throughput(200), True),
+}
+
+
+def run_benchmarks() -> dict[str, float]:
+    results = {}
+    for name, (func, _) in BENCHMARKS.items():
+        results[name] = round(func(), 4)
+        print(f"{name}: {results[name]}")
+    return results
+
+
+def compare_with_baseline(
+    results: dict[str, float], baseline: dict[str, float], tolerance: float
+) -> list[str]:
+    """ベースラインから tolerance (割合) を超えて悪化した計測のメッセージを返す関数。"""
+    regressions = []
+    for name, value in results.items():
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        higher_is_better = BENCHMARKS[name][1]
+        change = (base - value) / base if higher_is_better else (value - base) / base
+        status = "悪化" if change > tolerance else "OK"
+        print(f"  {name}: ベースライン {base} -> 今回 {value} ({change:+.1%} の悪化率) {status}")
+        if change > tolerance:
+            regressions.append(f"{name} がベースラインより {change:.1%} 悪化しました。")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="オフラインの性能ベンチマークを実行します。")
+    parser.add_argument("--update-baseline", action="store_true", help="計測結果をベースラインとして保存します。")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="ベースラインのJSONファイル。")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="悪化とみなす割合 (既定 0.2 = 20%%)。")
+    args = parser.parse_args()
+
+    results = run_benchmarks()
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"ベースラインを更新しました: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("ベースラインがありません。--update-baseline で作成してください。")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print("\nベースラインとの比較:")
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    for message in regressions:
+        print(message)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,10 +3,98 @@ import os
 # 環境変数から各種キー/URLを取得
 GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
 DISCORD_WEBHOOK_URL: str = os.getenv("DISCORD_WEBHOOK_URL", "")
+# 複数チャンネルへ配信する場合の送信先 (JSON配列)
+# 例: [{"url": "https://...", "name": "general", "username": "ナカヤマ", "avatar_url": "https://..."}]
+DISCORD_WEBHOOK_TARGETS: str = os.getenv("DISCORD_WEBHOOK_TARGETS", "")
+# 複数送信先へ同時に送信する際の最大スレッド数
+DISCORD_MAX_WORKERS: int = int(os.getenv("DISCORD_MAX_WORKERS", "8"))
 
 # GeminiモデルID
 GEMINI_MODEL_ID: str = os.getenv("GEMINI_MODEL_ID", "gemini-2.5-flash-preview-04-17")
 
+# Gemini応答キャッシュの設定 (キーはモデルIDと整形済みプロンプトのハッシュ)
+GEMINI_CACHE_ENABLED: bool = os.getenv("GEMINI_CACHE_ENABLED", "1") != "0"
+# 1 にするとキャッシュを読まずに必ずAPIを呼び出す (結果はキャッシュに書き戻す)
+GEMINI_CACHE_BYPASS: bool = os.getenv("GEMINI_CACHE_BYPASS", "0") == "1"
+GEMINI_CACHE_TTL_HOURS: float = float(os.getenv("GEMINI_CACHE_TTL_HOURS", "24"))
+GEMINI_CACHE_MAX_MB: float = float(os.getenv("GEMINI_CACHE_MAX_MB", "50"))
+
+# Geminiの応答をストリーミングで受け取り、Discordのメッセージを逐次編集して表示する
+GEMINI_STREAMING: bool = os.getenv("GEMINI_STREAMING", "0") == "1"
+# ストリーミング時にDiscordのメッセージを編集する最小間隔(秒)
+DISCORD_STREAM_EDIT_INTERVAL_SECONDS: float = float(
+    os.getenv("DISCORD_STREAM_EDIT_INTERVAL_SECONDS", "1.5")
+)
+
+# バックフィル (日付範囲の一括生成) のバッチジョブ状態を確認する間隔(秒)
+BACKFILL_POLL_SECONDS: float = float(os.getenv("BACKFILL_POLL_SECONDS", "30"))
+
+# Gemini版とyfinance版を並行して実行するヘッジ実行モード
+HEDGED_EXECUTION: bool = os.getenv("HEDGED_EXECUTION", "0") == "1"
+# ヘッジ実行時、Geminiの応答を待つ上限秒数 (処理開始からの経過時間)
+GEMINI_LATENCY_BUDGET_SECONDS: float = float(
+    os.getenv("GEMINI_LATENCY_BUDGET_SECONDS", "90")
+)
+
+# 外部呼び出し (Gemini / Discord) の再試行設定
+RETRY_MAX_ATTEMPTS: int = int(os.getenv("RETRY_MAX_ATTEMPTS", "3"))
+RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "1"))
+RETRY_MAX_DELAY_SECONDS: float = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "20"))
+# 1回の実行全体の締め切り(秒)。残り時間が待ち時間より短ければ再試行しない
+RUN_DEADLINE_SECONDS: float = float(os.getenv("RUN_DEADLINE_SECONDS", "240"))
+# Geminiの失敗がこの回数続いたら、冷却期間の間はGeminiを呼ばずにフォールバックする
+GEMINI_CIRCUIT_FAILURE_THRESHOLD: int = int(
+    os.getenv("GEMINI_CIRCUIT_FAILURE_THRESHOLD", "3")
+)
+GEMINI_CIRCUIT_COOLDOWN_MINUTES: float = float(
+    os.getenv("GEMINI_CIRCUIT_COOLDOWN_MINUTES", "60")
+)
+
+# サマリーで扱う指標 (ID, 表示名, yfinanceティッカー, 通貨記号, 小数点以下桁数)
+# GEMINI_PROMPT_TEMPLATE に列挙している指標と同じ並びにしておく。
+# ID は構造化出力モードでGeminiに返させる識別子として使う
+MARKET_INSTRUMENTS: list[tuple[str, str, str, str, int]] = [
+    ("nikkei225", "日経平均", "^N225", "¥", 2),
+    ("sp500", "S&P 500", "^GSPC", "$", 2),
+    ("djia", "ダウ平均", "^DJI", "$", 2),
+    ("nasdaq", "ナスダック総合", "^IXIC", "", 2),
+    ("usdjpy", "米ドル/円", "JPY=X", "¥", 3),
+    ("eurusd", "ユーロ/米ドル", "EURUSD=X", "$", 4),
+    ("btcusd", "ビットコイン", "BTC-USD", "$", 2),
+    ("ethusd", "イーサリアム", "ETH-USD", "$", 2),
+    ("xauusd", "金 (先物)", "GC=F", "$", 2),
+    ("xagusd", "銀 (先物)", "SI=F", "$", 3),
+]
+
+# ローカルキャッシュの保存先ディレクトリ (実行間で永続化できる場所を指定する)
+CACHE_DIR: str = os.getenv("CACHE_DIR", ".cache")
+
+# 日付・送信先・レポート種別ごとの配信台帳 (CACHE_DIR/deliveries.sqlite3)
+# 同じ日付の再実行や同時実行で、配信済みのサマリーを再生成・再投稿しない
+DELIVERY_LEDGER_ENABLED: bool = os.getenv("DELIVERY_LEDGER_ENABLED", "1") != "0"
+
+# 処理段階ごとの計測結果の出力先 (空にすると出力しない)
+# JSON Lines は実行ごとに追記され、p50/p95 の推移を追える履歴になる
+METRICS_JSONL_PATH: str = os.getenv(
+    "METRICS_JSONL_PATH", os.path.join(CACHE_DIR, "metrics", "runs.jsonl")
+)
+# node_exporter の textfile collector 向けファイル (直近の実行分で上書き)
+METRICS_PROMETHEUS_PATH: str = os.getenv("METRICS_PROMETHEUS_PATH", "")
+
+# yfinance価格キャッシュの設定
+YFINANCE_CACHE_ENABLED: bool = os.getenv("YFINANCE_CACHE_ENABLED", "1") != "0"
+# 最終取得からこの時間(分)以内なら再取得しない
+YFINANCE_CACHE_TTL_MINUTES: int = int(os.getenv("YFINANCE_CACHE_TTL_MINUTES", "60"))
+# この日数より古いバーはキャッシュから削除する
+YFINANCE_CACHE_RETENTION_DAYS: int = int(
+    os.getenv("YFINANCE_CACHE_RETENTION_DAYS", "400")
+)
+# yfinance版サマリーの指標 (52週高安値・移動平均など) の計算に使う期間(暦日)
+# キャッシュの保持期間 (YFINANCE_CACHE_RETENTION_DAYS) 以下にしておく
+YFINANCE_INDICATOR_LOOKBACK_DAYS: int = int(
+    os.getenv("YFINANCE_INDICATOR_LOOKBACK_DAYS", "400")
+)
+
 # Geminiに渡すプロンプトテンプレート
 GEMINI_PROMPT_TEMPLATE = """\
 日付：{calculated_date}
@@ -34,3 +122,62 @@ GEMINI_PROMPT_TEMPLATE = """\
 
 出力開始：
 """
+
+# 東京市場の引け後レポート用のプロンプトテンプレート
+GEMINI_TOKYO_CLOSE_PROMPT_TEMPLATE = """\
+日付：{calculated_date}
+
+指示：
+1. Groundingツールを使用して最新の信頼できる情報にアクセスし、**{calculated_date}** の東京市場の**終値** (為替・暗号資産・金は日本時間15時30分頃の値)、および**その前営業日の終値**を見つけてください。各指標について、**最も一般的に報告されているか、または最終的な終値と思われる単一の値**を選んでください：
+    - 日経平均 (Nikkei 225)
+    - 米ドル/円 (USD/JPY)
+    - ユーロ/米ドル (EUR/USD)
+    - ビットコイン (BTC/USD)
+    - 金スポット価格 (XAU/USD)
+2. 取得した2つの価格情報（当日、前営業日）に基づいて、前日比の騰落率を計算してください。
+3. **{calculated_date}** の東京市場の動き、日本株・日経平均・為替に関連する主要な金融ニュースヘッドラインを3〜5件見つけてください。
+4. 出力全体をDiscordで見やすいようにMarkdownを使用してフォーマットしてください。具体的には、タイトルやセクション見出しには太字を使用し、リストには箇条書き（ハイフン `-` またはアスタリスク `*`）を使用してください。
+5. 最初にタイトル「**{calculated_date} の東京市場サマリー**」を付けてください。
+6. 各指標とその**当日終値**、**前日比騰落率**を「指標名: 当日終値 (前日比 XX.X%)」の形式で、箇条書きとしてリストしてください。**価格は必ず単一の値としてください（例: ドル円: 155.00 (前日比 +0.5%)）**。価格が利用できない場合は「N/A」を使用してください。騰落率も同様に、計算できない場合は「N/A」としてください。
+7. 価格リストの後、新しい行にセクションタイトル「**主要ニュースヘッドライン:**」を追加してください。
+8. そのタイトルの下に、ニュースヘッドラインを箇条書きとしてリストしてください。
+9. 最終的な出力は、要求されたテキストコンテンツのみとしてください。
+
+出力開始：
+"""
+
+# スケジュールの "prompt" で指定できるプロンプトテンプレート
+GEMINI_PROMPT_TEMPLATES: dict[str, str] = {
+    "default": GEMINI_PROMPT_TEMPLATE,
+    "tokyo_close": GEMINI_TOKYO_CLOSE_PROMPT_TEMPLATE,
+}
+
+# 常駐モード (--daemon) のスケジュール (JSON配列、空なら scheduler.DEFAULT_REPORT_SCHEDULES)
+# 例: [{"name": "us_close", "time": "16:15", "timezone": "America/New_York",
+#       "weekdays": [0, 1, 2, 3, 4], "prompt": "default", "instruments": ["sp500", "djia"]}]
+REPORT_SCHEDULES: str = os.getenv("REPORT_SCHEDULES", "")
+
+# Geminiの出力形式: "markdown" (Geminiが最終Markdownまで作る) または
+# "json" (数値と見出しだけをJSONで受け取り、騰落率とMarkdownはローカルで作る)
+GEMINI_OUTPUT_FORMAT: str = os.getenv("GEMINI_OUTPUT_FORMAT", "markdown")
+# json形式のとき、Geminiの価格をyfinanceの価格と突き合わせる
+GEMINI_CROSS_VALIDATE: bool = os.getenv("GEMINI_CROSS_VALIDATE", "1") != "0"
+# 突き合わせで差異とみなす乖離率(%)
+GEMINI_CROSS_VALIDATE_TOLERANCE_PERCENT: float = float(
+    os.getenv("GEMINI_CROSS_VALIDATE_TOLERANCE_PERCENT", "2.0")
+)
+
+# json形式のときにGeminiに渡すプロンプトテンプレート
+GEMINI_JSON_PROMPT_TEMPLATE = """\
+日付：{calculated_date}
+
+指示：
+1. Groundingツールを使用して最新の信頼できる情報にアクセスし、**{calculated_date}** の**終値**、および**その前日の終値**を、以下の各指標について見つけてください。各指標について、最も一般的に報告されているか、または最終的な終値と思われる単一の値を選んでください (左がID、右が指標名)：
+{instrument_list}
+2. **{calculated_date}** または翌朝の、市場全体のムードやこれらの特定の指標に関連する主要な金融ニュースヘッドラインを3〜5件見つけてください。日本株、日経についての情報も含めてください。
+3. 騰落率の計算や文章の整形は不要です。次のJSONスキーマに従うJSONオブジェクトのみを出力してください。説明文やコードブロックは付けないでください。
+{{"instruments": [{{"id": "<ID>", "close": <当日終値の数値 または null>, "previous_close": <前日終値の数値 または null>}}], "headlines": ["<ヘッドライン>"]}}
+4. 値が見つからない場合は null としてください。
+
+出力開始：
+"""
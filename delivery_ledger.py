@@ -0,0 +1,121 @@
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def destination_key(url: str) -> str:
+    """Webhook URL (トークンを含む) をそのまま保存しないよう、ハッシュにして送信先のキーにする。"""
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:32]
+
+
+@dataclasses.dataclass
+class Delivery:
+    """1つの送信先へのサマリーの配信記録。"""
+
+    content_hash: str
+    message_ids: list[str]
+    completed: bool
+
+
+class DeliveryLedger:
+    """日付・送信先・レポート種別 (variant) ごとの配信状況を保存するSQLiteベースの台帳。
+
+    contents テーブルに生成済みのサマリー本文を、deliveries テーブルに送信先ごとの
+    本文ハッシュ・DiscordメッセージID・完了したかどうかを保持する。同じ日付の再実行では、
+    完了済みなら何もせず、途中までなら足りない手順だけをやり直すために使う。
+    """
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS contents ("
+            " date TEXT NOT NULL, variant TEXT NOT NULL, content TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL, created_at REAL NOT NULL,"
+            " PRIMARY KEY (date, variant))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            " date TEXT NOT NULL, destination TEXT NOT NULL, variant TEXT NOT NULL,"
+            " content_hash TEXT NOT NULL, message_ids TEXT NOT NULL,"
+            " completed INTEGER NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (date, destination, variant))"
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get_content(self, date: str, variant: str) -> str | None:
+        """生成済みのサマリー本文を返す。"""
+        row = self.conn.execute(
+            "SELECT content FROM contents WHERE date = ? AND variant = ?", (date, variant)
+        ).fetchone()
+        return row[0] if row else None
+
+    def store_content(self, date: str, variant: str, text: str) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO contents (date, variant, content, content_hash, created_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (date, variant, text, content_hash(text), time.time()),
+        )
+        self.conn.commit()
+
+    def get_delivery(self, date: str, url: str, variant: str) -> Delivery | None:
+        row = self.conn.execute(
+            "SELECT content_hash, message_ids, completed FROM deliveries"
+            " WHERE date = ? AND destination = ? AND variant = ?",
+            (date, destination_key(url), variant),
+        ).fetchone()
+        if not row:
+            return None
+        return Delivery(content_hash=row[0], message_ids=json.loads(row[1]), completed=bool(row[2]))
+
+    def record_delivery(
+        self,
+        date: str,
+        url: str,
+        variant: str,
+        text_hash: str,
+        message_ids: list[str],
+        completed: bool,
+    ) -> None:
+        """送信先への配信状況を記録する。投稿済みで本文が未確定の場合は completed=False にする。"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO deliveries"
+            " (date, destination, variant, content_hash, message_ids, completed, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                date,
+                destination_key(url),
+                variant,
+                text_hash,
+                json.dumps(message_ids),
+                int(completed),
+                time.time(),
+            ),
+        )
+        self.conn.commit()
+
+    def is_complete(self, date: str, variant: str, urls: list[str]) -> bool:
+        """生成済みの本文がすべての送信先に配信済みなら True を返す。"""
+        row = self.conn.execute(
+            "SELECT content_hash FROM contents WHERE date = ? AND variant = ?", (date, variant)
+        ).fetchone()
+        if not row or not urls:
+            return False
+        for url in urls:
+            delivery = self.get_delivery(date, url, variant)
+            if delivery is None or not delivery.completed or delivery.content_hash != row[0]:
+                return False
+        return True
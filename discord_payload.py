@@ -0,0 +1,191 @@
+import re
+
+# Discord Webhook の上限 (文字数)
+CONTENT_LIMIT = 2000
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBEDS_PER_MESSAGE = 10
+MESSAGE_EMBED_TOTAL_LIMIT = 6000
+
+# エラー通知の埋め込みの色 (赤)
+NOTICE_COLOR = 0xE74C3C
+
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+# 言語名だけが付いた開始フェンス (```python など)
+_OPENING_FENCE_RE = re.compile(r"^\s*(```|~~~)[\w+-]*\s*$")
+# これより少ない残りしかないメッセージには埋め込みを追加しない
+_MIN_EMBED_SIZE = 200
+# 長い単位を分割するとき、今の片の残りがこれ以上あればそこから詰める
+_MIN_SPLIT_SIZE = 100
+_TRUNCATED_MARKER = "\n\n…(長すぎるため省略されました)"
+
+
+def _is_heading(line: str) -> bool:
+    """見出し (# 見出し、または行全体が太字のタイトル) なら True を返す。"""
+    stripped = line.strip()
+    return stripped.startswith("#") or (
+        len(stripped) > 4 and stripped.startswith("**") and stripped.endswith("**")
+    )
+
+
+def _parse_sections(text: str) -> list[list[str]]:
+    """テキストを見出しごとのセクションに分け、各セクションを分割単位のリストにする。
+
+    分割単位は1行 (箇条書きの1項目など)、またはコードブロック全体。
+    """
+    sections: list[list[str]] = [[]]
+    code_block: list[str] | None = None
+    for line in text.split("\n"):
+        if code_block is not None:
+            code_block.append(line)
+            if line.rstrip().endswith(("```", "~~~")):
+                sections[-1].append("\n".join(code_block))
+                code_block = None
+            continue
+        stripped = line.strip()
+        if _FENCE_RE.match(line) and not (len(stripped) > 6 and stripped.endswith(stripped[:3])):
+            code_block = [line]
+            continue
+        if _is_heading(line) and sections[-1]:
+            sections.append([])
+        sections[-1].append(line)
+    if code_block is not None:
+        # 閉じられていないコードブロックは末尾までをひとまとまりとする
+        sections[-1].append("\n".join(code_block))
+    return [section for section in sections if section]
+
+
+def _split_long_unit(unit: str, limit: int, first_limit: int | None = None) -> list[str]:
+    """上限を超える1単位を分割する。コードブロックは行単位で分け、各片でフェンスを閉じ直す。
+
+    first_limit を指定すると、最初の片だけその文字数以内にする (何も収まらなければ空文字列)。
+    """
+    first_limit = limit if first_limit is None else first_limit
+    lines = unit.split("\n")
+    if len(lines) > 1 and _FENCE_RE.match(lines[0]):
+        fence = _FENCE_RE.match(lines[0]).group(1)
+        if _OPENING_FENCE_RE.match(lines[0]):
+            opening, body = lines[0].strip(), lines[1:]
+        else:
+            # ```Traceback... のように開始フェンスの直後から本文が続く場合
+            opening, body = fence, [lines[0].strip()[len(fence) :], *lines[1:]]
+        if body and body[-1].rstrip().endswith(fence):
+            body[-1] = body[-1].rstrip()[: -len(fence)]
+            if not body[-1].strip():
+                body.pop()
+        overhead = len(opening) + len(fence) + 2
+        room = limit - overhead
+        units = [line for raw in body for line in _hard_split(raw, room)]
+        chunks = _pack_units(units, room, first_limit - overhead)
+        return [f"{opening}\n{chunk}\n{fence}" if chunk else "" for chunk in chunks]
+    return _pack_units(
+        [piece for line in lines for piece in _hard_split(line, limit)], limit, first_limit
+    )
+
+
+def _hard_split(line: str, limit: int) -> list[str]:
+    return [line[i : i + limit] for i in range(0, len(line), limit)] or [""]
+
+
+def _pack_units(units: list[str], limit: int, first_limit: int | None = None) -> list[str]:
+    """単位を改行でつなぎ、上限を超えない範囲でできるだけ少ない片にまとめる。
+
+    first_limit を指定すると、最初の片だけその文字数以内にする。最初の単位が first_limit に
+    収まらず分割もしない場合、最初の片は空文字列になる (呼び出し側は今の片をそこで閉じる)。
+    """
+    chunks: list[str] = []
+    current = ""
+    for unit in units:
+        current_limit = limit if chunks or first_limit is None else first_limit
+        candidate = f"{current}\n{unit}" if current else unit
+        if len(candidate) <= current_limit:
+            current = candidate
+            continue
+        room = current_limit - len(current) - 1 if current else current_limit
+        if len(unit) > limit and room >= _MIN_SPLIT_SIZE:
+            # 長いコードブロックなどは、今の片の残りを埋めるところから分割する
+            first, *pieces = _split_long_unit(unit, limit, room)
+            chunks.append(f"{current}\n{first}" if current and first else current or first)
+            current = pieces.pop() if pieces else ""
+            chunks.extend(pieces)
+            continue
+        if current or (not chunks and current_limit < limit):
+            # 最初の片に収まらない単位は、最初の片を空のまま閉じて次の片から詰める
+            chunks.append(current)
+        if len(unit) <= limit:
+            current = unit
+        else:
+            *pieces, current = _split_long_unit(unit, limit)
+            chunks.extend(pieces)
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_markdown(text: str, limit: int) -> list[str]:
+    """Markdownを見出し・箇条書き・コードブロックの境目で、limit 文字以内の片に分割する関数。
+
+    セクションはなるべく1つの片に収め、収まらない場合だけ行やコードブロックの単位で分ける。
+    """
+    text = text.strip("\n")
+    if len(text) <= limit:
+        return [text] if text else []
+    chunks: list[str] = []
+    for section in _parse_sections(text):
+        section_text = "\n".join(section)
+        if chunks and len(chunks[-1]) + 1 + len(section_text) <= limit:
+            chunks[-1] += "\n" + section_text
+        elif len(section_text) <= limit:
+            chunks.append(section_text)
+        else:
+            chunks.extend(_pack_units(section, limit))
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+def pack_payloads(text: str, notices: list[str] | tuple[str, ...] = ()) -> list[dict]:
+    """本文と通知を、できるだけ少ない数のWebhookリクエストのペイロードにまとめる関数。
+
+    通知がなく本文が CONTENT_LIMIT 以内なら content だけのペイロード1つを返す。それ以外は
+    通知 (赤) と本文を埋め込みの説明文に分割し、1メッセージあたり EMBEDS_PER_MESSAGE 個・
+    合計 MESSAGE_EMBED_TOTAL_LIMIT 文字以内になるように詰める。
+    """
+    if not notices and len(text) <= CONTENT_LIMIT:
+        return [{"content": text}] if text else []
+
+    parts = [(notice, NOTICE_COLOR) for notice in notices if notice]
+    if text:
+        parts.append((text, None))
+
+    payloads: list[dict] = []
+    room = 0  # 現在のメッセージに残っている文字数
+    for part, color in parts:
+        remaining = part
+        while remaining:
+            if (
+                not payloads
+                or len(payloads[-1]["embeds"]) >= EMBEDS_PER_MESSAGE
+                or room < _MIN_EMBED_SIZE
+            ):
+                payloads.append({"embeds": []})
+                room = MESSAGE_EMBED_TOTAL_LIMIT
+            # 前の埋め込みで余った分も使えるよう、残りの文字数に合わせて切り出す
+            chunks = split_markdown(remaining, min(EMBED_DESCRIPTION_LIMIT, room))
+            if not chunks:
+                break
+            embed = {"description": chunks[0]}
+            if color is not None:
+                embed["color"] = color
+            payloads[-1]["embeds"].append(embed)
+            room -= len(chunks[0])
+            remaining = "\n".join(chunks[1:])
+    return payloads
+
+
+def pack_single_payload(text: str) -> dict:
+    """1つのメッセージに収まるペイロードを返す関数。収まらない分は省略する (メッセージ編集用)。"""
+    payloads = pack_payloads(text)
+    # 分割の境目で余りが出るため、1件に収まるまで少しずつ短くする
+    room = MESSAGE_EMBED_TOTAL_LIMIT - len(_TRUNCATED_MARKER)
+    while len(payloads) > 1:
+        room -= 500
+        payloads = pack_payloads(text[:room] + _TRUNCATED_MARKER)
+    return payloads[0] if payloads else {"content": ""}
@@ -1,28 +1,481 @@
+import concurrent.futures
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
 import requests
-from config import DISCORD_WEBHOOK_URL
+from requests.adapters import HTTPAdapter
+
+import metrics
+from discord_payload import pack_payloads, pack_single_payload
+from config import (
+    DISCORD_MAX_WORKERS,
+    DISCORD_WEBHOOK_TARGETS,
+    DISCORD_WEBHOOK_URL,
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_MAX_DELAY_SECONDS,
+)
+from retry_policy import (
+    RetryPolicy,
+    call_with_retry,
+    get_run_deadline,
+    is_safe_to_resend,
+    is_transient_error,
+)
+
+DEFAULT_AVATAR_URL = "https://nagauchi.notion.site/image/attachment%3Ab902c629-b9e6-4a80-ad6e-8e3fede730f7%3Aimage.png?table=block&id=1c2b7378-9dfa-8080-89e8-f7277514877b&spaceId=a484c95d-6c4f-4e4a-97ac-db6e1790d144&width=2000&userId=&cache=v2"
+
+
+@dataclass(frozen=True)
+class WebhookTarget:
+    """配信先のWebhook。username / avatar_url を指定すると送信時の値を上書きする。"""
+
+    url: str
+    name: str = ""
+    username: str | None = None
+    avatar_url: str | None = None
+
+
+def get_webhook_targets() -> list[WebhookTarget]:
+    """環境変数から配信先の一覧を組み立てる関数。
+
+    DISCORD_WEBHOOK_TARGETS (JSON配列) と DISCORD_WEBHOOK_URL の両方を読み、
+    重複するURLは1つにまとめる。
+    """
+    targets: list[WebhookTarget] = []
+    if DISCORD_WEBHOOK_TARGETS:
+        try:
+            entries = json.loads(DISCORD_WEBHOOK_TARGETS)
+        except json.JSONDecodeError as e:
+            print(f"DISCORD_WEBHOOK_TARGETS の解析に失敗しました: {e}")
+            entries = []
+        for i, entry in enumerate(entries):
+            if isinstance(entry, str):
+                entry = {"url": entry}
+            if not entry.get("url"):
+                print(f"DISCORD_WEBHOOK_TARGETS の {i} 番目にURLがありません。")
+                continue
+            targets.append(
+                WebhookTarget(
+                    url=entry["url"],
+                    name=entry.get("name") or f"target-{i}",
+                    username=entry.get("username"),
+                    avatar_url=entry.get("avatar_url"),
+                )
+            )
+    if DISCORD_WEBHOOK_URL and all(t.url != DISCORD_WEBHOOK_URL for t in targets):
+        targets.insert(0, WebhookTarget(url=DISCORD_WEBHOOK_URL, name="default"))
+    return targets
+
+
+class _RateLimitBucket:
+    """Discordのレート制限バケット1つ分の状態。"""
+
+    def __init__(self) -> None:
+        self.remaining: int | None = None
+        self.reset_at: float = 0.0
+
+
+class DiscordWebhookSender:
+    """1つの requests.Session を使い回して Discord Webhook に送信するクラス。
+
+    レスポンスの X-RateLimit-* ヘッダーからWebhookごとのバケット残量を追跡し、
+    残量が尽きていればリセットまで待ってから送信する。429 を受けた場合は
+    retry_after だけ待って再送する。接続エラーや 5xx は retry_policy に従って再試行する。
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 5,
+        timeout: float = 10.0,
+        session: requests.Session | None = None,
+        retry_policy: RetryPolicy | None = None,
+    ) -> None:
+        if session is None:
+            session = requests.Session()
+            # 複数送信先への同時送信でもコネクションを使い回せるようにプールを広げておく
+            adapter = HTTPAdapter(pool_maxsize=max(DISCORD_MAX_WORKERS, 10))
+            session.mount("https://", adapter)
+        self.session = session
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.retry_policy = retry_policy or RetryPolicy(
+            max_attempts=RETRY_MAX_ATTEMPTS,
+            base_delay=RETRY_BASE_DELAY_SECONDS,
+            max_delay=RETRY_MAX_DELAY_SECONDS,
+        )
+        self._lock = threading.Lock()
+        self._route_buckets: dict[str, str] = {}  # Webhook URL -> バケットID
+        # (バケットID, Webhook URL) -> 状態。Webhookの実行ルートはどのWebhookでも同じ
+        # バケットIDが返るため、IDだけをキーにすると別のWebhookの残量を共有してしまう
+        self._buckets: dict[tuple[str, str], _RateLimitBucket] = {}
+        self._global_reset_at = 0.0
+        self._clock = time.monotonic
+        self._sleep = time.sleep
+
+    def _bucket_for(self, url: str) -> _RateLimitBucket:
+        bucket_id = self._route_buckets.get(url, "")
+        return self._buckets.setdefault((bucket_id, url), _RateLimitBucket())
+
+    def _acquire(self, url: str) -> None:
+        """バケットに残量ができるまで待ち、1リクエスト分を予約する。"""
+        while True:
+            with self._lock:
+                now = self._clock()
+                bucket = self._bucket_for(url)
+                if bucket.reset_at <= now:
+                    bucket.remaining = None  # リセット済み。次のレスポンスで更新される
+                wait = max(self._global_reset_at - now, 0.0)
+                if bucket.remaining is not None and bucket.remaining <= 0:
+                    wait = max(wait, bucket.reset_at - now)
+                if wait <= 0:
+                    if bucket.remaining is not None:
+                        bucket.remaining -= 1
+                    return
+            print(f"Discordのレート制限のため {wait:.2f} 秒待機します。")
+            self._sleep(wait)
+
+    def _update_bucket(self, url: str, response: requests.Response) -> None:
+        """レスポンスヘッダーからバケットの状態を更新する。"""
+        headers = response.headers
+        with self._lock:
+            bucket_id = headers.get("X-RateLimit-Bucket")
+            if bucket_id:
+                self._route_buckets[url] = bucket_id
+            bucket = self._bucket_for(url)
+            remaining = headers.get("X-RateLimit-Remaining")
+            reset_after = headers.get("X-RateLimit-Reset-After")
+            if remaining is not None:
+                bucket.remaining = int(remaining)
+            if reset_after is not None:
+                bucket.reset_at = self._clock() + float(reset_after)
+
+    def _retry_after(self, response: requests.Response) -> tuple[float, bool]:
+        """429レスポンスから待機秒数とグローバル制限かどうかを取り出す。"""
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        retry_after = body.get("retry_after") or response.headers.get("Retry-After", 1)
+        is_global = bool(body.get("global")) or "X-RateLimit-Global" in response.headers
+        return float(retry_after), is_global
+
+    def post(
+        self, url: str, payload: dict, params: dict | None = None
+    ) -> requests.Response:
+        """レート制限を守りながら payload をPOSTし、最終的なレスポンスを返す。"""
+        return self.request("POST", url, payload, params=params)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        payload: dict,
+        params: dict | None = None,
+        bucket_key: str | None = None,
+    ) -> requests.Response:
+        """レート制限を守りながらリクエストを送り、最終的なレスポンスを返す。
+
+        bucket_key はレート制限の追跡単位 (省略時は url)。POST (メッセージの投稿) は冪等でないため、
+        接続前のエラーと一時的なHTTPステータスの場合だけ再試行する (読み取りタイムアウトでは
+        投稿済みのことが多く、再送すると二重投稿になる)。
+        """
+        url_key = bucket_key or url
+        send = getattr(self.session, method.lower())
+        is_retryable = is_safe_to_resend if method.upper() == "POST" else is_transient_error
+
+        def send_once() -> requests.Response:
+            self._acquire(url_key)
+            response = send(url, json=payload, params=params, timeout=self.timeout)
+            metrics.increment("discord_http_responses", label=str(response.status_code))
+            self._update_bucket(url_key, response)
+            if response.status_code >= 500:
+                response.raise_for_status()  # 5xx は再試行の対象にする
+            return response
+
+        for attempt in range(self.max_retries + 1):
+            response = call_with_retry(
+                send_once,
+                self.retry_policy,
+                is_retryable=is_retryable,
+                name="discord",
+                sleep=self._sleep,
+            )
+            if response.status_code != 429 or attempt == self.max_retries:
+                return response
+            retry_after, is_global = self._retry_after(response)
+            if retry_after >= get_run_deadline().remaining():
+                print("Discordのレート制限の解除を待つと実行の締め切りを超えるため、再送しません。")
+                return response
+            metrics.increment("discord_retries", label="429")
+            print(
+                f"Discordから429を受信しました。{retry_after:.2f} 秒後に再送します。"
+                f" ({attempt + 1}/{self.max_retries})"
+            )
+            with self._lock:
+                if is_global:
+                    self._global_reset_at = self._clock() + retry_after
+                else:
+                    bucket = self._bucket_for(url_key)
+                    bucket.remaining = 0
+                    bucket.reset_at = self._clock() + retry_after
+        return response
+
+    def send(
+        self,
+        text: str,
+        username: str = "ナカヤマ",
+        url: str | None = None,
+        avatar_url: str = DEFAULT_AVATAR_URL,
+        notices: list[str] | tuple[str, ...] = (),
+    ) -> int:
+        """メッセージを送信し、成功時はステータスコード、失敗時は -1 を返す。
+
+        notices (エラー通知など) は本文と同じリクエストに埋め込みとしてまとめる。
+        上限を超える本文は pack_payloads で分割し、必要な数だけ順に送信する。
+        """
+        url = url or DISCORD_WEBHOOK_URL
+        if not url:
+            print("Discord Webhook URLが設定されていません。送信をスキップします。")
+            return -1
+        if not text and not notices:
+            print("送信するテキストがありません。")
+            return -1
+
+        payloads = pack_payloads(text, notices)
+        send_span = metrics.start_span(
+            "discord.send", username=username, messages=len(payloads)
+        )
+        try:
+            print(f"Discord Webhook ({username}) に送信中... ({len(payloads)} 件)")
+            for payload in payloads:
+                data = {"username": username, "avatar_url": avatar_url, **payload}
+                response = self.post(url, data)
+                send_span["status"] = response.status_code
+                response.raise_for_status()
+            print(f"Discordに送信しました。ステータスコード: {response.status_code}")
+            return response.status_code
+        except requests.exceptions.RequestException as e:
+            print(f"Discord Webhookへの送信中にエラーが発生しました: {e}")
+            send_span["error"] = type(e).__name__
+            return -1
+        finally:
+            metrics.end_span(send_span)
+
+    def post_message(
+        self,
+        text: str,
+        username: str = "ナカヤマ",
+        url: str | None = None,
+        avatar_url: str = DEFAULT_AVATAR_URL,
+    ) -> str | None:
+        """?wait=true でメッセージを1件送信し、作成されたメッセージのIDを返す。失敗時は None。
+
+        1件に収まらない本文は省略される (全文を送る場合は post_messages を使う)。
+        """
+        url = url or DISCORD_WEBHOOK_URL
+        if not url or not text:
+            return None
+        return self._post_payload_for_id(url, pack_single_payload(text), username, avatar_url)
+
+    def post_messages(
+        self,
+        text: str,
+        username: str = "ナカヤマ",
+        url: str | None = None,
+        avatar_url: str = DEFAULT_AVATAR_URL,
+        notices: list[str] | tuple[str, ...] = (),
+    ) -> list[str] | None:
+        """本文 (と通知) を必要な数のメッセージに分けて送信し、メッセージIDのリストを返す。
+
+        途中で失敗した場合は None を返す。
+        """
+        url = url or DISCORD_WEBHOOK_URL
+        if not url or (not text and not notices):
+            return None
+        message_ids = []
+        for payload in pack_payloads(text, notices):
+            message_id = self._post_payload_for_id(url, payload, username, avatar_url)
+            if message_id is None:
+                return None
+            message_ids.append(message_id)
+        return message_ids
+
+    def _post_payload_for_id(
+        self, url: str, payload: dict, username: str, avatar_url: str
+    ) -> str | None:
+        data = {"username": username, "avatar_url": avatar_url, **payload}
+        try:
+            response = self.post(url, data, params={"wait": "true"})
+            response.raise_for_status()
+            return str(response.json()["id"])
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            print(f"Discord Webhookへの送信中にエラーが発生しました: {e}")
+            return None
+
+    def edit_message(self, url: str, message_id: str, text: str) -> int:
+        """Webhookで送信済みのメッセージ本文を書き換え、ステータスコード (失敗時は -1) を返す。
+
+        1件に収まらない本文は省略される。
+        """
+        return self._edit_payload(url, message_id, pack_single_payload(text))
+
+    def edit_messages(self, url: str, message_ids: list[str], text: str) -> int:
+        """post_messages で送信した複数のメッセージを、新しい本文で順に書き換える。
+
+        分割後のメッセージ数が message_ids と異なる場合は編集せずに -1 を返す。
+        """
+        payloads = pack_payloads(text)
+        if not message_ids or len(payloads) != len(message_ids):
+            return -1
+        status = -1
+        for message_id, payload in zip(message_ids, payloads):
+            status = self._edit_payload(url, message_id, payload)
+            if status == -1:
+                return -1
+        return status
+
+    def _edit_payload(self, url: str, message_id: str, payload: dict) -> int:
+        # 本文が伸びて埋め込みに切り替わった場合、元の content が残らないように空にする
+        data = payload if "content" in payload else {"content": "", **payload}
+        try:
+            response = self.request(
+                "PATCH",
+                f"{url}/messages/{message_id}",
+                data,
+                bucket_key=f"{url}/messages",
+            )
+            response.raise_for_status()
+            return response.status_code
+        except requests.exceptions.RequestException as e:
+            print(f"Discordメッセージの編集中にエラーが発生しました: {e}")
+            return -1
+
+    def broadcast(
+        self,
+        text: str,
+        targets: list[WebhookTarget],
+        username: str = "ナカヤマ",
+        max_workers: int = DISCORD_MAX_WORKERS,
+        notices: list[str] | tuple[str, ...] = (),
+    ) -> list[tuple[WebhookTarget, int]]:
+        """同じメッセージを複数の送信先へスレッドプールで同時に送信する。
+
+        戻り値は送信先ごとの (送信先, ステータスコード or -1) のリストで、targets と同じ順に並ぶ。
+        """
+        if not targets:
+            print("Discordの送信先が設定されていません。送信をスキップします。")
+            return []
+
+        def send_one(target: WebhookTarget) -> int:
+            return self.send(
+                text,
+                username=target.username or username,
+                url=target.url,
+                avatar_url=target.avatar_url or DEFAULT_AVATAR_URL,
+                notices=notices,
+            )
+
+        workers = max(1, min(max_workers, len(targets)))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            statuses = list(executor.map(send_one, targets))
+
+        results = list(zip(targets, statuses))
+        succeeded = sum(1 for _, status in results if status != -1)
+        print(f"Discord配信結果: {succeeded}/{len(results)} 件成功")
+        for target, status in results:
+            if status == -1:
+                print(f"  - {target.name}: 送信失敗")
+        return results
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class ProgressiveMessage:
+    """生成途中のテキストを1つのメッセージとして投稿し、編集で追記していくクラス。
+
+    最初の update で投稿し、以降は min_interval 秒以上空けて編集する (間のテキストはまとめる)。
+    finish では最後のテキストを必ず反映する。message_id を渡すと既存のメッセージを編集し、
+    on_post は新しく投稿したときにそのメッセージIDで呼び出される。
+    """
+
+    def __init__(
+        self,
+        sender: DiscordWebhookSender,
+        target: WebhookTarget,
+        username: str = "ナカヤマ",
+        min_interval: float = 1.5,
+        message_id: str | None = None,
+        on_post: Callable[[str], None] | None = None,
+    ) -> None:
+        self.sender = sender
+        self.target = target
+        self.username = target.username or username
+        self.min_interval = min_interval
+        self.message_id = message_id
+        self.on_post = on_post
+        self._last_sent_text = ""
+        self._last_sent_at = 0.0
+
+    def update(self, text: str, force: bool = False) -> None:
+        if not text or text == self._last_sent_text:
+            return
+        now = time.monotonic()
+        if self.message_id is None:
+            self.message_id = self.sender.post_message(
+                text,
+                username=self.username,
+                url=self.target.url,
+                avatar_url=self.target.avatar_url or DEFAULT_AVATAR_URL,
+            )
+            if self.message_id is None:
+                return
+            if self.on_post:
+                self.on_post(self.message_id)
+        elif force or now - self._last_sent_at >= self.min_interval:
+            if self.sender.edit_message(self.target.url, self.message_id, text) == -1:
+                return
+        else:
+            return
+        self._last_sent_text = text
+        self._last_sent_at = now
+
+    def finish(self, text: str) -> None:
+        self.update(text, force=True)
+
+
+_default_sender: DiscordWebhookSender | None = None
+
+
+def get_default_sender() -> DiscordWebhookSender:
+    """プロセス内で共有する送信オブジェクトを返す。"""
+    global _default_sender
+    if _default_sender is None:
+        _default_sender = DiscordWebhookSender()
+    return _default_sender
 
 
 def send_to_discord(text: str, username: str = "ナカヤマ") -> int:
     """Discord Webhook にメッセージを送信する共通関数。"""
-    if not DISCORD_WEBHOOK_URL:
-        print("Discord Webhook URLが設定されていません。送信をスキップします。")
-        return -1
-    if not text:
-        print("送信するテキストがありません。")
-        return -1
-
-    data: dict[str, str] = {
-        "username": username,
-        "avatar_url": "https://nagauchi.notion.site/image/attachment%3Ab902c629-b9e6-4a80-ad6e-8e3fede730f7%3Aimage.png?table=block&id=1c2b7378-9dfa-8080-89e8-f7277514877b&spaceId=a484c95d-6c4f-4e4a-97ac-db6e1790d144&width=2000&userId=&cache=v2",
-        "content": text,
-    }
-
-    try:
-        print(f"Discord Webhook ({username}) に送信中...")
-        response = requests.post(DISCORD_WEBHOOK_URL, json=data)
-        response.raise_for_status()
-        print(f"Discordに送信しました。ステータスコード: {response.status_code}")
-        return response.status_code
-    except requests.exceptions.RequestException as e:
-        print(f"Discord Webhookへの送信中にエラーが発生しました: {e}")
-        return -1
+    return get_default_sender().send(text, username=username)
+
+
+def broadcast_to_discord(
+    text: str,
+    username: str = "ナカヤマ",
+    targets: list[WebhookTarget] | None = None,
+    notices: list[str] | tuple[str, ...] = (),
+) -> list[tuple[WebhookTarget, int]]:
+    """設定されたすべての送信先にメッセージを同時に送信する共通関数。
+
+    notices (エラー通知など) は本文と同じリクエストにまとめて送る。
+    """
+    if targets is None:
+        targets = get_webhook_targets()
+    return get_default_sender().broadcast(
+        text, targets, username=username, notices=notices
+    )
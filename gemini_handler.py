@@ -1,44 +1,162 @@
-from google import genai
-from google.genai.types import Tool, GenerateContentConfig, GoogleSearch
-from config import GOOGLE_API_KEY, GEMINI_PROMPT_TEMPLATE, GEMINI_MODEL_ID
+import os
+from typing import Callable, Iterator
 
-# Gemini APIのクライアントを作成
-gemini_api_client = None
-if GOOGLE_API_KEY:
+from config import (
+    CACHE_DIR,
+    GEMINI_CACHE_BYPASS,
+    GEMINI_CACHE_ENABLED,
+    GEMINI_CIRCUIT_COOLDOWN_MINUTES,
+    GEMINI_CIRCUIT_FAILURE_THRESHOLD,
+    GEMINI_CACHE_MAX_MB,
+    GEMINI_CACHE_TTL_HOURS,
+    GOOGLE_API_KEY,
+    GEMINI_JSON_PROMPT_TEMPLATE,
+    GEMINI_PROMPT_TEMPLATE,
+    GEMINI_MODEL_ID,
+    MARKET_INSTRUMENTS,
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_MAX_DELAY_SECONDS,
+)
+from market_report import MarketReport, parse_market_report
+import metrics
+from providers import get_provider, register_provider
+from response_cache import ResponseCache
+from retry_policy import CircuitBreaker, RetryPolicy, call_with_retry
+
+
+def _create_gemini_client():
+    """Gemini APIのクライアントを作成する関数。google.genai はここで初めてインポートする。"""
+    if not GOOGLE_API_KEY:
+        return None
     try:
-        gemini_api_client = genai.Client(api_key=GOOGLE_API_KEY)
+        from google import genai  # 関数内インポート
+
+        client = genai.Client(api_key=GOOGLE_API_KEY)
         print("Gemini API クライアントを作成しました。")
+        return client
     except Exception as e:
         print(f"Gemini API クライアントの作成に失敗しました: {e}")
-        # gemini_api_client は None のままなので、後続処理でフォールバックされる
+        # None を返すので、後続処理でフォールバックされる
+        return None
+
+
+register_provider("gemini_client", _create_gemini_client)
+
+
+def get_gemini_client():
+    """Gemini APIのクライアントを返す関数。初回呼び出し時に作成する。"""
+    return get_provider("gemini_client")
+
 
+def _get_response_cache() -> ResponseCache | None:
+    if not GEMINI_CACHE_ENABLED:
+        return None
+    return ResponseCache(
+        os.path.join(CACHE_DIR, "gemini"),
+        ttl_seconds=GEMINI_CACHE_TTL_HOURS * 3600,
+        max_bytes=int(GEMINI_CACHE_MAX_MB * 1024 * 1024),
+    )
+
+
+def _get_retry_policy() -> RetryPolicy:
+    return RetryPolicy(
+        max_attempts=RETRY_MAX_ATTEMPTS,
+        base_delay=RETRY_BASE_DELAY_SECONDS,
+        max_delay=RETRY_MAX_DELAY_SECONDS,
+    )
+
+
+def get_gemini_circuit_breaker() -> CircuitBreaker:
+    """Gemini呼び出しの失敗を実行をまたいで記録するサーキットブレーカーを返す関数。"""
+    return CircuitBreaker(
+        os.path.join(CACHE_DIR, "gemini_circuit.json"),
+        failure_threshold=GEMINI_CIRCUIT_FAILURE_THRESHOLD,
+        cooldown_seconds=GEMINI_CIRCUIT_COOLDOWN_MINUTES * 60,
+    )
 
-def build_gemini_prompt(date_str: str) -> str:
+
+def build_gemini_prompt(date_str: str, template: str = GEMINI_PROMPT_TEMPLATE) -> str:
     """プロンプトテンプレートに日付を埋め込む関数。"""
-    return GEMINI_PROMPT_TEMPLATE.format(calculated_date=date_str)
+    return template.format(calculated_date=date_str)
+
+
+def build_structured_gemini_prompt(
+    date_str: str, instruments: list[tuple] = MARKET_INSTRUMENTS
+) -> str:
+    """JSON形式で数値と見出しだけを返させるプロンプトを作る関数。"""
+    instrument_list = "\n".join(
+        f"    - {instrument_id}: {name}"
+        for instrument_id, name, _, _, _ in instruments
+    )
+    return GEMINI_JSON_PROMPT_TEMPLATE.format(
+        calculated_date=date_str, instrument_list=instrument_list
+    )
+
+
+def get_financial_summary_from_gemini(
+    prompt: str,
+    bypass_cache: bool = GEMINI_CACHE_BYPASS,
+    validate: Callable[[str], object] | None = None,
+) -> str | None:
+    """Gemini API クライアントを使用して、金融市場サマリーを取得する関数。
 
+    同じモデル・同じプロンプト (日付を含む) の応答はキャッシュから返す。
+    bypass_cache が True の場合はキャッシュを読まずにAPIを呼び出す。
+    validate を指定すると、ValueError を送出した応答はキャッシュに保存せず
+    (キャッシュ済みのものは使わずにAPIを呼び出し)、その例外を送出する。
+    """
+    cache = _get_response_cache()
+    cache_key = ResponseCache.make_key(GEMINI_MODEL_ID, prompt)
+    if cache and not bypass_cache:
+        cached_text = cache.get(cache_key)
+        if cached_text and validate:
+            try:
+                validate(cached_text)
+            except ValueError:
+                print("キャッシュ済みのGemini応答が不正なため、APIを呼び出します。")
+                cached_text = None
+        if cached_text:
+            print("キャッシュ済みのGemini応答を使用します。")
+            metrics.increment("gemini_cache", label="hit")
+            return cached_text
+        metrics.increment("gemini_cache", label="miss")
 
-def get_financial_summary_from_gemini(prompt: str) -> str | None:
-    """Gemini API クライアントを使用して、金融市場サマリーを取得する関数。"""
+    gemini_api_client = get_gemini_client()
     if not gemini_api_client:
         print("Geminiクライアントが初期化されていません。")
         return None
     try:
+        from google.genai.types import Tool, GenerateContentConfig, GoogleSearch
+
         print(f"モデル '{GEMINI_MODEL_ID}' を使用してGemini API呼び出し中...")
 
         google_search_tool = Tool(
             google_search=GoogleSearch()
         )  # リンターエラー箇所 (指示により無視)
-        response = gemini_api_client.models.generate_content(
-            model=GEMINI_MODEL_ID,
-            contents=prompt,
-            config=GenerateContentConfig(
-                tools=[google_search_tool],
-            ),
-        )
+        def generate():
+            with metrics.span("gemini.generate_content", model=GEMINI_MODEL_ID):
+                return gemini_api_client.models.generate_content(
+                    model=GEMINI_MODEL_ID,
+                    contents=prompt,
+                    config=GenerateContentConfig(
+                        tools=[google_search_tool],
+                    ),
+                )
+
+        # 一時的なエラー (429 / 5xx / 接続エラー) は実行の残り時間の範囲で再試行する
+        response = call_with_retry(generate, _get_retry_policy(), name="gemini")
+        metrics.record_token_usage("generate_content", response)
 
         if response and response.text:
             print("Geminiからの応答を取得しました。")
+            if validate:
+                validate(response.text)  # 不正な応答はキャッシュしない
+            if cache:
+                try:
+                    cache.put(cache_key, response.text, model=GEMINI_MODEL_ID)
+                except OSError as e:
+                    print(f"Gemini応答のキャッシュ保存に失敗しました: {e}")
             return response.text
         else:
             print("Geminiからテキスト応答がありませんでした。")
@@ -47,3 +165,78 @@ def get_financial_summary_from_gemini(prompt: str) -> str | None:
     except Exception as e:
         print(f"Gemini API呼び出し中にエラーが発生しました: {e}")
         raise  # エラーを再送出して呼び出し元でキャッチする
+
+
+def stream_financial_summary_from_gemini(
+    prompt: str, bypass_cache: bool = GEMINI_CACHE_BYPASS
+) -> Iterator[str]:
+    """Gemini のストリーミングAPIで金融市場サマリーを生成し、届いた順にテキスト片を返すジェネレーター。
+
+    キャッシュにある場合は全文を1つの片として返す。生成し終えた全文はキャッシュに保存する。
+    """
+    cache = _get_response_cache()
+    cache_key = ResponseCache.make_key(GEMINI_MODEL_ID, prompt)
+    if cache and not bypass_cache:
+        cached_text = cache.get(cache_key)
+        if cached_text:
+            print("キャッシュ済みのGemini応答を使用します。")
+            metrics.increment("gemini_cache", label="hit")
+            yield cached_text
+            return
+        metrics.increment("gemini_cache", label="miss")
+
+    gemini_api_client = get_gemini_client()
+    if not gemini_api_client:
+        print("Geminiクライアントが初期化されていません。")
+        return
+    from google.genai.types import Tool, GenerateContentConfig, GoogleSearch
+
+    print(f"モデル '{GEMINI_MODEL_ID}' を使用してGemini API (ストリーミング) 呼び出し中...")
+    chunks: list[str] = []
+    stream_span = metrics.start_span("gemini.generate_content_stream", model=GEMINI_MODEL_ID)
+    try:
+        last_chunk = None
+        for chunk in gemini_api_client.models.generate_content_stream(
+            model=GEMINI_MODEL_ID,
+            contents=prompt,
+            config=GenerateContentConfig(tools=[Tool(google_search=GoogleSearch())]),
+        ):
+            last_chunk = chunk
+            if chunk.text:
+                if not chunks:
+                    stream_span["first_chunk_ms"] = metrics.elapsed_ms(stream_span)
+                chunks.append(chunk.text)
+                yield chunk.text
+        # 使用量は最後のチャンクに集計される
+        metrics.record_token_usage("generate_content_stream", last_chunk)
+    except Exception as e:
+        stream_span["error"] = type(e).__name__
+        raise
+    finally:
+        metrics.end_span(stream_span, chunks=len(chunks))
+
+    if chunks and cache:
+        try:
+            cache.put(cache_key, "".join(chunks), model=GEMINI_MODEL_ID)
+        except OSError as e:
+            print(f"Gemini応答のキャッシュ保存に失敗しました: {e}")
+
+
+def get_market_report_from_gemini(
+    date_str: str,
+    bypass_cache: bool = GEMINI_CACHE_BYPASS,
+    instruments: list[tuple] = MARKET_INSTRUMENTS,
+) -> MarketReport | None:
+    """GeminiからJSON形式で数値と見出しを取得し、MarketReport に変換する関数。
+
+    Google検索ツールとレスポンススキーマ指定は併用できないため、スキーマはプロンプトで指示する。
+    JSONとして解釈できない応答の場合は ValueError を送出する。
+    """
+    text = get_financial_summary_from_gemini(
+        build_structured_gemini_prompt(date_str, instruments),
+        bypass_cache,
+        validate=lambda reply: parse_market_report(reply, date_str, instruments),
+    )
+    if not text:
+        return None
+    return parse_market_report(text, date_str, instruments)
@@ -0,0 +1,124 @@
+import math
+
+from providers import get_provider
+
+# 移動平均・ボラティリティの期間 (営業日数)
+SMA_SHORT_BARS = 20
+SMA_LONG_BARS = 50
+VOLATILITY_BARS = 20
+
+# compute_indicators が返す列
+INDICATOR_COLUMNS = [
+    "close",
+    "previous_close",
+    "change_1d",
+    "change_1w",
+    "change_1m",
+    "sma20",
+    "sma50",
+    "vs_sma20",
+    "vs_sma50",
+    "volatility",
+    "high_52w",
+    "low_52w",
+    "from_high_52w",
+    "from_low_52w",
+]
+
+
+def pack_latest_bars(closes):
+    """各列の欠損を除いた値を末尾に詰めたDataFrameを返す関数。
+
+    取引日が指標ごとに異なる (暗号資産は土日も値が付く) ため、日付ではなく
+    「何本前のバーか」で揃える。最終行が各ティッカーの直近終値になる。
+    """
+    np = get_provider("numpy")
+    pd = get_provider("pandas")
+
+    values = closes.to_numpy(dtype=float)
+    # 安定ソートで欠損 (False) を先頭に、値のある行を元の順序のまま末尾に寄せる
+    order = np.argsort(~np.isnan(values), axis=0, kind="stable")
+    return pd.DataFrame(np.take_along_axis(values, order, axis=0), columns=closes.columns)
+
+
+def compute_indicators(closes):
+    """(日付 x ティッカー) の終値から、全ティッカー分の指標をまとめて計算する関数。
+
+    戻り値は (ティッカー x INDICATOR_COLUMNS) のDataFrameで、騰落率・乖離率は%、
+    ボラティリティは日次対数収益率の標準偏差を年率換算した%。計算に必要なデータが
+    足りない値は NaN になる。
+    """
+    np = get_provider("numpy")
+    pd = get_provider("pandas")
+
+    if closes.empty:
+        return pd.DataFrame(index=closes.columns, columns=INDICATOR_COLUMNS, dtype=float)
+    closes = closes.sort_index()
+    closes.index = pd.to_datetime(closes.index)
+    last_date = closes.index[-1]
+
+    # 前日比・移動平均・ボラティリティは営業日 (バー) 単位で計算する
+    bars = pack_latest_bars(closes)
+    close = bars.iloc[-1]
+    previous_close = bars.shift(1).iloc[-1]
+    sma20 = bars.rolling(SMA_SHORT_BARS).mean().iloc[-1]
+    sma50 = bars.rolling(SMA_LONG_BARS).mean().iloc[-1]
+    log_returns = np.log(bars).diff()
+    # 年率換算の日数は、土日にも値があるティッカー (暗号資産) は365日、それ以外は252日
+    trades_on_weekends = closes[closes.index.dayofweek >= 5].notna().any()
+    periods_per_year = pd.Series(
+        np.where(trades_on_weekends, 365, 252), index=closes.columns
+    )
+    volatility = (
+        log_returns.rolling(VOLATILITY_BARS).std().iloc[-1] * np.sqrt(periods_per_year) * 100
+    )
+
+    # 週次・月次の騰落率と52週高安値は暦日で区切る
+    filled = closes.ffill()
+
+    def close_as_of(date):
+        past = filled.loc[:date]
+        if past.empty:
+            return pd.Series(np.nan, index=closes.columns)
+        return past.iloc[-1]
+
+    year = closes.loc[closes.index > last_date - pd.DateOffset(weeks=52)]
+    high_52w = year.max()
+    low_52w = year.min()
+
+    return pd.DataFrame(
+        {
+            "close": close,
+            "previous_close": previous_close,
+            "change_1d": (close / previous_close - 1) * 100,
+            "change_1w": (close / close_as_of(last_date - pd.DateOffset(weeks=1)) - 1) * 100,
+            "change_1m": (close / close_as_of(last_date - pd.DateOffset(months=1)) - 1) * 100,
+            "sma20": sma20,
+            "sma50": sma50,
+            "vs_sma20": (close / sma20 - 1) * 100,
+            "vs_sma50": (close / sma50 - 1) * 100,
+            "volatility": volatility,
+            "high_52w": high_52w,
+            "low_52w": low_52w,
+            "from_high_52w": (close / high_52w - 1) * 100,
+            "from_low_52w": (close / low_52w - 1) * 100,
+        },
+        columns=INDICATOR_COLUMNS,
+    )
+
+
+def _percent(value, signed: bool = True) -> str:
+    if value is None or math.isnan(value):
+        return "N/A"
+    return f"{value:+.2f}%" if signed else f"{value:.1f}%"
+
+
+def format_indicators(row) -> str:
+    """compute_indicators の1行を、サマリーに添える1行のテキストにする関数。"""
+    return (
+        f"　週 {_percent(row['change_1w'])} / 月 {_percent(row['change_1m'])}"
+        f" / 20日線比 {_percent(row['vs_sma20'])} / 50日線比 {_percent(row['vs_sma50'])}"
+        f" / ボラ(年率) {_percent(row['volatility'], signed=False)}"
+        f" / 52週高値比 {_percent(row['from_high_52w'])}"
+        f" / 52週安値比 {_percent(row['from_low_52w'])}\n"
+    )
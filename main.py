@@ -1,39 +1,486 @@
+import argparse
+import concurrent.futures
+import datetime
+import os
+import threading
+import time
 import traceback
-from config import GOOGLE_API_KEY, DISCORD_WEBHOOK_URL
-from common_utils import get_calculated_date
-from discord_sender import send_to_discord
+from config import (
+    CACHE_DIR,
+    DELIVERY_LEDGER_ENABLED,
+    DISCORD_MAX_WORKERS,
+    DISCORD_STREAM_EDIT_INTERVAL_SECONDS,
+    GEMINI_CACHE_BYPASS,
+    GEMINI_CROSS_VALIDATE,
+    GEMINI_CROSS_VALIDATE_TOLERANCE_PERCENT,
+    GEMINI_LATENCY_BUDGET_SECONDS,
+    GEMINI_OUTPUT_FORMAT,
+    GEMINI_PROMPT_TEMPLATE,
+    GEMINI_STREAMING,
+    GOOGLE_API_KEY,
+    HEDGED_EXECUTION,
+    MARKET_INSTRUMENTS,
+    METRICS_JSONL_PATH,
+    METRICS_PROMETHEUS_PATH,
+    RUN_DEADLINE_SECONDS,
+)
+import metrics
+from common_utils import format_calculated_date, get_calculated_date
+from delivery_ledger import DeliveryLedger, content_hash
+from discord_sender import (
+    DEFAULT_AVATAR_URL,
+    ProgressiveMessage,
+    broadcast_to_discord,
+    get_default_sender,
+    get_webhook_targets,
+)
 from gemini_handler import (
-    gemini_api_client,
+    get_gemini_circuit_breaker,
+    get_gemini_client,
     build_gemini_prompt,
     get_financial_summary_from_gemini,
+    get_market_report_from_gemini,
+    stream_financial_summary_from_gemini,
 )
-from yfinance_handler import get_summary_from_yfinance
+from market_report import cross_validate, render_market_report
+from providers import get_provider
+from retry_policy import start_run_deadline
+from scheduler import ReportSchedule, get_report_schedules, run_daemon
+from yfinance_handler import get_close_prices_yfinance, get_summary_from_yfinance
+
+
+def fetch_gemini_summary(
+    calculated_date: str,
+    bypass_cache: bool,
+    instruments: list[tuple] = MARKET_INSTRUMENTS,
+    prompt_template: str = GEMINI_PROMPT_TEMPLATE,
+) -> str | None:
+    """GEMINI_OUTPUT_FORMAT に応じてGeminiからサマリーを取得し、Markdownで返す関数。"""
+    if GEMINI_OUTPUT_FORMAT != "json":
+        gemini_prompt = build_gemini_prompt(calculated_date, prompt_template)
+        return get_financial_summary_from_gemini(gemini_prompt, bypass_cache)
+
+    report = get_market_report_from_gemini(calculated_date, bypass_cache, instruments)
+    if report is None:
+        return None
+    if GEMINI_CROSS_VALIDATE:
+        tickers = [ticker for _, _, ticker, _, _ in instruments]
+        report.warnings = cross_validate(
+            report,
+            get_close_prices_yfinance(tickers),
+            GEMINI_CROSS_VALIDATE_TOLERANCE_PERCENT,
+        )
+        if report.warnings:
+            print(f"yfinanceとの価格差異が {len(report.warnings)} 件ありました。")
+    return render_market_report(report)
+
+
+def stream_gemini_summary_to_discord(
+    calculated_date: str,
+    bypass_cache: bool,
+    webhook_targets: list,
+    prompt_template: str = GEMINI_PROMPT_TEMPLATE,
+    ledger: DeliveryLedger | None = None,
+    variant: str = "default",
+) -> str | None:
+    """Geminiのストリーミング応答を受け取りながら、各送信先のメッセージを逐次更新する関数。
+
+    最初の片が届いた時点で投稿し、以降はメッセージ編集で追記する。全文を返す。
+    ledger がある場合、投稿したメッセージを未完了の配信として記録し、前回の実行で
+    投稿済みのメッセージがあればそれを編集する。
+    """
+    sender = get_default_sender()
+    messages = []
+    for target in webhook_targets:
+        delivery = ledger.get_delivery(calculated_date, target.url, variant) if ledger else None
+        on_post = None
+        if ledger:
+            on_post = lambda message_id, url=target.url: ledger.record_delivery(
+                calculated_date, url, variant, "", [message_id], False
+            )
+        messages.append(
+            ProgressiveMessage(
+                sender,
+                target,
+                min_interval=DISCORD_STREAM_EDIT_INTERVAL_SECONDS,
+                message_id=delivery.message_ids[0] if delivery and delivery.message_ids else None,
+                on_post=on_post,
+            )
+        )
+    text = ""
+    try:
+        for chunk in stream_financial_summary_from_gemini(
+            build_gemini_prompt(calculated_date, prompt_template), bypass_cache
+        ):
+            text += chunk
+            for message in messages:
+                message.update(text)
+    except Exception:
+        if text:
+            for message in messages:
+                message.finish(text + "\n\n⚠️ (生成が中断されました)")
+        raise
+    for message in messages:
+        message.finish(text)
+    return text or None
+
+
+def deliver_summary(
+    text: str,
+    webhook_targets: list,
+    ledger: DeliveryLedger,
+    calculated_date: str,
+    variant: str,
+    already_posted: bool = False,
+    notices: list[str] | tuple[str, ...] = (),
+) -> None:
+    """配信台帳を確認しながら、サマリーを未配信の送信先にだけ配信する関数。
+
+    同じ本文を配信済みの送信先は飛ばし、投稿済みのメッセージがある送信先は新しく投稿せずに
+    編集で本文を置き換える。already_posted が True (ストリーミングで最終本文まで反映済み) の
+    場合、メッセージのある送信先は配信済みとして記録するだけにする。
+    notices (エラー通知) は新しく投稿するサマリーと同じリクエストにまとめる。
+    """
+    ledger.store_content(calculated_date, variant, text)
+    text_hash = content_hash(text)
+    pending = []
+    for target in webhook_targets:
+        delivery = ledger.get_delivery(calculated_date, target.url, variant)
+        if delivery and delivery.completed and delivery.content_hash == text_hash:
+            continue
+        message_ids = delivery.message_ids if delivery else []
+        if already_posted and message_ids:
+            ledger.record_delivery(
+                calculated_date, target.url, variant, text_hash, message_ids, True
+            )
+            continue
+        pending.append((target, message_ids))
+    if not pending:
+        print("全送信先に配信済みです。")
+        return
 
+    sender = get_default_sender()
 
-def main_logic() -> None:  # 関数名を変更して __main__ ブロックの処理と区別
-    """メイン処理ロジック。"""
-    calculated_date = get_calculated_date()
+    def deliver_one(item) -> list[str]:
+        target, message_ids = item
+        avatar_url = target.avatar_url or DEFAULT_AVATAR_URL
+        if message_ids and sender.edit_messages(target.url, message_ids, text) != -1:
+            if notices:
+                sender.send(
+                    "",
+                    username=target.username or "エラー通知ナカヤマ",
+                    url=target.url,
+                    avatar_url=avatar_url,
+                    notices=notices,
+                )
+            return message_ids
+        posted_ids = sender.post_messages(
+            text,
+            username=target.username or "ナカヤマ",
+            url=target.url,
+            avatar_url=avatar_url,
+            notices=notices,
+        )
+        return posted_ids or []
+
+    # SQLiteの接続はこのスレッドでだけ使い、送信だけを並行して行う
+    workers = max(1, min(DISCORD_MAX_WORKERS, len(pending)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(deliver_one, pending))
+
+    for (target, _), message_ids in zip(pending, results):
+        if message_ids:
+            ledger.record_delivery(
+                calculated_date, target.url, variant, text_hash, message_ids, True
+            )
+        else:
+            print(f"  - {target.name}: 送信失敗")
+    succeeded = sum(1 for message_ids in results if message_ids)
+    print(
+        f"Discord配信結果: {succeeded}/{len(pending)} 件成功"
+        f" (配信済み {len(webhook_targets) - len(pending)} 件)"
+    )
+
+
+def open_delivery_ledger() -> DeliveryLedger | None:
+    if not DELIVERY_LEDGER_ENABLED:
+        return None
+    try:
+        return DeliveryLedger(os.path.join(CACHE_DIR, "deliveries.sqlite3"))
+    except Exception as e:
+        print(f"配信台帳を開けませんでした: {e}")
+        return None
+
+
+def main_logic(
+    hedged: bool = HEDGED_EXECUTION,
+    bypass_cache: bool = GEMINI_CACHE_BYPASS,
+    streaming: bool = GEMINI_STREAMING,
+    schedule: ReportSchedule | None = None,
+    run_at: datetime.datetime | None = None,
+) -> None:  # 関数名を変更して __main__ ブロックの処理と区別
+    """メイン処理ロジック。処理全体と各段階の所要時間を計測し、最後に書き出す。"""
+    ledger = open_delivery_ledger()
+    try:
+        with metrics.span("main.total", schedule=schedule.name if schedule else ""):
+            _run_main_logic(hedged, bypass_cache, streaming, schedule, run_at, ledger)
+    finally:
+        if ledger:
+            ledger.close()
+        metrics.emit_metrics(METRICS_JSONL_PATH, METRICS_PROMETHEUS_PATH)
+
+
+def _run_main_logic(
+    hedged: bool,
+    bypass_cache: bool,
+    streaming: bool,
+    schedule: ReportSchedule | None = None,
+    run_at: datetime.datetime | None = None,
+    ledger: DeliveryLedger | None = None,
+) -> None:
+    """メイン処理ロジックの本体。
+
+    hedged が True の場合、yfinance版の取得をGemini呼び出しと並行して開始し、
+    GEMINI_LATENCY_BUDGET_SECONDS 内にGeminiの応答がなければ先読みしたyfinance版を使う。
+    bypass_cache が True の場合、Gemini応答キャッシュを読まずにAPIを呼び出す。
+    streaming が True の場合 (ヘッジ実行・JSON形式以外)、Geminiの応答を逐次Discordに反映する。
+    schedule が指定された場合 (常駐モード)、そのプロンプトと指標を使い、対象日付は
+    run_at (予定時刻) のスケジュールのタイムゾーンでの日付とする。
+    ledger (配信台帳) がある場合、同じ日付・種別のサマリーが全送信先に配信済みなら何もせず、
+    生成済みなら生成を省いて未配信の送信先にだけ配信する。bypass_cache が True の場合は
+    台帳の記録を使わずにサマリーを作り直し、配信済みのメッセージは新しい本文に編集する。
+    """
+    started_at = time.monotonic()
+    start_run_deadline(RUN_DEADLINE_SECONDS)
+    instruments = schedule.market_instruments if schedule else MARKET_INSTRUMENTS
+    prompt_template = schedule.prompt_template if schedule else GEMINI_PROMPT_TEMPLATE
+    if schedule:
+        run_at = run_at or datetime.datetime.now(datetime.timezone.utc)
+        calculated_date = format_calculated_date(run_at.astimezone(schedule.tzinfo))
+    else:
+        calculated_date = get_calculated_date()
     print(f"対象日付: {calculated_date}")
+    webhook_targets = get_webhook_targets()
+    if not webhook_targets:
+        ledger = None  # コンソール表示のみの実行は記録しない
+
+    variant = schedule.name if schedule else "default"
+    if ledger and bypass_cache:
+        # キャッシュを使わない再実行では、配信済みでも作り直して既存のメッセージを更新する
+        print("キャッシュを使わないため、配信台帳の記録にかかわらずサマリーを作り直します。")
+        metrics.increment("delivery_ledger", label="bypass")
+    elif ledger and ledger.is_complete(
+        calculated_date, variant, [target.url for target in webhook_targets]
+    ):
+        # 別のワークフローや再実行で配信済みなら、Gemini・yfinanceを呼ばずに終了する
+        print(f"{calculated_date} のサマリー ({variant}) は全送信先に配信済みです。処理を終了します。")
+        metrics.increment("delivery_ledger", label="complete")
+        return
+    stored_summary = (
+        ledger.get_content(calculated_date, variant) if ledger and not bypass_cache else None
+    )
 
+    summary_already_posted = False
+    notices: list[str] = []
+    if stored_summary:
+        print("生成済みのサマリーがあるため、未配信の送信先にだけ配信します。")
+        metrics.increment("delivery_ledger", label="resume")
+        final_summary = stored_summary
+        error_message_for_discord = None
+        summary_generated = True
+    else:
+        (
+            final_summary,
+            summary_already_posted,
+            error_message_for_discord,
+            summary_generated,
+        ) = _generate_summary(
+            calculated_date,
+            webhook_targets,
+            hedged,
+            bypass_cache,
+            streaming,
+            instruments,
+            prompt_template,
+            started_at,
+            ledger,
+            variant,
+            notices,
+        )
+
+    # 3. 最終的なサマリーをDiscordに送信
+    post_phase = metrics.start_span("main.post", targets=len(webhook_targets))
+    if final_summary and summary_already_posted:
+        print("\n--- 最終サマリーはストリーミングで送信済みです ---")
+        if ledger:
+            deliver_summary(
+                final_summary, webhook_targets, ledger, calculated_date, variant, True
+            )
+        if notices:
+            broadcast_to_discord(
+                "", username="エラー通知ナカヤマ", targets=webhook_targets, notices=notices
+            )
+    elif final_summary:
+        # エラー通知があれば、サマリーと同じリクエストにまとめて送る
+        if webhook_targets and ledger and summary_generated:
+            print("\n--- 最終サマリーをDiscordに送信 (配信台帳を確認) ---")
+            deliver_summary(
+                final_summary,
+                webhook_targets,
+                ledger,
+                calculated_date,
+                variant,
+                notices=notices,
+            )
+        elif webhook_targets:
+            print("\n--- 最終サマリーをDiscordに送信 ---")
+            broadcast_to_discord(
+                final_summary,
+                username="ナカヤマ",
+                targets=webhook_targets,
+                notices=notices,
+            )
+        else:
+            print("\n--- 最終サマリー (コンソール表示のみ) ---")
+            for notice in notices:
+                print(notice)
+            print(final_summary)
+            print(
+                "Discordの送信先未設定のため、最終サマリーのDiscord送信はスキップされました。"
+            )
+    else:
+        # このelseブロックは、Geminiもyfinanceもデータを返さず、かつエラーメッセージも特になかった稀なケース
+        # (例: Geminiが正常にNoneを返し、error_message_for_discordも設定されなかった場合)
+        no_summary_message = (
+            f"{calculated_date} の金融市場サマリーは取得できませんでした。"
+        )
+        if notices and webhook_targets:
+            broadcast_to_discord(
+                "", username="エラー通知ナカヤマ", targets=webhook_targets, notices=notices
+            )
+        elif not error_message_for_discord:  # まだエラーメッセージが設定されていなければ
+            if webhook_targets:
+                broadcast_to_discord(
+                    f"ℹ️ {no_summary_message}",
+                    username="ナカヤマ",
+                    targets=webhook_targets,
+                )
+            else:
+                print(f"ℹ️ {no_summary_message} (Discord通知スキップ)")
+        print(no_summary_message)  # コンソールには必ず表示
+    metrics.end_span(post_phase)
+
+
+def _start_daemon_call(func, *args) -> concurrent.futures.Future:
+    """func(*args) をデーモンスレッドで実行し、その結果を受け取る Future を返す関数。
+
+    ThreadPoolExecutor のワーカーと違い、制限時間を過ぎたGemini呼び出しや不要になった
+    yfinanceの先読みが終わるのをプロセスの終了時に待たない。そのスレッドの計測は
+    今回の実行のものとし、次の実行に入ってから記録されたものは捨てる。
+    """
+    future: concurrent.futures.Future = concurrent.futures.Future()
+    run = metrics.current_run()
+
+    def run_call() -> None:
+        metrics.bind_run(run)
+        try:
+            future.set_result(func(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    future.set_running_or_notify_cancel()
+    threading.Thread(target=run_call, daemon=True).start()
+    return future
+
+
+def _generate_summary(
+    calculated_date: str,
+    webhook_targets: list,
+    hedged: bool,
+    bypass_cache: bool,
+    streaming: bool,
+    instruments: list[tuple],
+    prompt_template: str,
+    started_at: float,
+    ledger: DeliveryLedger | None,
+    variant: str,
+    notices: list[str],
+) -> tuple[str | None, bool, str | None, bool]:
+    """Gemini版を試行し、失敗した場合はyfinance版にフォールバックする関数。
+
+    エラー通知は notices に追加する (最終サマリーと一緒に送信する)。戻り値は (最終サマリー, ストリーミングで投稿済みか, Geminiのエラーメッセージ,
+    サマリーが得られたか)。両方失敗した場合の最終サマリーはその旨の通知文になる。
+    """
     final_summary = None
     error_message_for_discord = None
+    # ストリーミングで投稿済みの場合は最後の送信を行わない
+    summary_already_posted = False
+    # Gemini版・yfinance版のどちらかのサマリーが得られたか (失敗の通知文は台帳に残さない)
+    summary_generated = False
+    streaming = (
+        streaming and not hedged and GEMINI_OUTPUT_FORMAT != "json" and bool(webhook_targets)
+    )
+
+    yfinance_future = None
+    if hedged:
+        print("ヘッジ実行モード: yfinance版の取得を並行して開始します。")
+        yfinance_future = _start_daemon_call(get_summary_from_yfinance, instruments)
 
     # 1. Gemini版を試行
-    if (
-        gemini_api_client and GOOGLE_API_KEY
-    ):  # gemini_api_client は gemini_handler で初期化
+    gemini_phase = metrics.start_span("main.gemini", hedged=hedged, streaming=streaming)
+    # 直近の失敗が続いている場合はGeminiを呼ばずにフォールバックする
+    gemini_circuit = get_gemini_circuit_breaker()
+    gemini_circuit_open = bool(GOOGLE_API_KEY) and not gemini_circuit.allow()
+    # APIキーがある場合のみクライアントを作成するので、google.genai のインポートもその時だけ行われる
+    gemini_api_client = (
+        get_gemini_client() if GOOGLE_API_KEY and not gemini_circuit_open else None
+    )
+    if gemini_api_client and GOOGLE_API_KEY:
         print("\n--- Gemini API版の処理を開始 ---")
         try:
-            gemini_prompt = build_gemini_prompt(calculated_date)
-            financial_summary_gemini = get_financial_summary_from_gemini(gemini_prompt)
+            if hedged:
+                gemini_future = _start_daemon_call(
+                    fetch_gemini_summary,
+                    calculated_date,
+                    bypass_cache,
+                    instruments,
+                    prompt_template,
+                )
+                remaining = GEMINI_LATENCY_BUDGET_SECONDS - (
+                    time.monotonic() - started_at
+                )
+                financial_summary_gemini = gemini_future.result(
+                    timeout=max(remaining, 0)
+                )
+            elif streaming:
+                financial_summary_gemini = stream_gemini_summary_to_discord(
+                    calculated_date,
+                    bypass_cache,
+                    webhook_targets,
+                    prompt_template,
+                    ledger,
+                    variant,
+                )
+                summary_already_posted = financial_summary_gemini is not None
+            else:
+                financial_summary_gemini = fetch_gemini_summary(
+                    calculated_date, bypass_cache, instruments, prompt_template
+                )
 
             if financial_summary_gemini:
                 final_summary = financial_summary_gemini
+                summary_generated = True
                 print("Gemini APIからサマリーを取得しました。")
             else:
                 error_message_for_discord = f"{calculated_date} の金融市場サマリー取得試行(Gemini API)で、有効な応答が得られませんでした。"
                 print(error_message_for_discord)
 
+        except concurrent.futures.TimeoutError:
+            error_message_for_discord = (
+                f"{calculated_date} の金融市場サマリー取得試行(Gemini API)が、"
+                f"制限時間 {GEMINI_LATENCY_BUDGET_SECONDS:g} 秒以内に完了しませんでした。"
+            )
+            print(error_message_for_discord)
         except Exception as e:
             print(f"Gemini API版の処理中にエラーが発生しました: {e}")
             tb_str = traceback.format_exc()
@@ -42,8 +489,13 @@ def main_logic() -> None:  # 関数名を変更して __main__ ブロックの
                 f"日付: {calculated_date}\n"
                 f"エラータイプ: {type(e).__name__}\n"
                 f"エラーメッセージ: {str(e)}\n"
-                f"--- トレースバック --- \n```{tb_str}```"
+                f"--- トレースバック --- \n```\n{tb_str}```"
             )
+
+        if final_summary:
+            gemini_circuit.record_success()
+        else:
+            gemini_circuit.record_failure()
     else:
         if not GOOGLE_API_KEY:
             message = (
@@ -51,6 +503,10 @@ def main_logic() -> None:  # 関数名を変更して __main__ ブロックの
             )
             print(message)
             error_message_for_discord = message
+        elif gemini_circuit_open:
+            message = "Gemini APIの失敗が直近で続いているため、Gemini API版をスキップします (サーキットブレーカー作動中)。"
+            print(message)
+            error_message_for_discord = message
         elif (
             not gemini_api_client
         ):  # Client初期化失敗時のメッセージはgemini_handler側で出力済みの想定
@@ -61,24 +517,24 @@ def main_logic() -> None:  # 関数名を変更して __main__ ブロックの
             ):  # 他でエラーメッセージが設定されていなければ設定
                 error_message_for_discord = message
 
-    # 2. Gemini版が失敗した場合、エラーメッセージを送信し、yfinance版にフォールバック
+    metrics.end_span(gemini_phase, succeeded=final_summary is not None)
+
+    # 2. Gemini版が失敗した場合、エラー通知を積み、yfinance版にフォールバック
+    fallback_phase = metrics.start_span("main.fallback")
     if error_message_for_discord:
-        if DISCORD_WEBHOOK_URL:
-            print("\n--- エラー情報をDiscordに送信 ---")
-            send_to_discord(
-                f"⚠️ Gemini API処理エラー通知 ⚠️\n{error_message_for_discord}",
-                username="エラー通知ナカヤマ",
-            )
-        else:
-            print(
-                "Discord Webhook URL未設定のため、Gemini APIエラー通知はスキップされました。"
-            )
+        # エラー通知は最終サマリーと同じリクエストにまとめて送る
+        notices.append(f"⚠️ Gemini API処理エラー通知 ⚠️\n{error_message_for_discord}")
 
         print("\n--- yfinance版へのフォールバック処理を開始 ---")
         try:
-            summary_yfinance = get_summary_from_yfinance()
+            if yfinance_future:
+                # ヘッジ実行で先読みした結果を使う
+                summary_yfinance = yfinance_future.result()
+            else:
+                summary_yfinance = get_summary_from_yfinance(instruments)
             yfinance_full_summary = f"**{calculated_date} の金融市場サマリー (yfinance代替)**\n\n{summary_yfinance}"
             final_summary = yfinance_full_summary
+            summary_generated = True
             print("yfinance版からサマリーを取得しました。")
         except Exception as e_yf:
             print(f"yfinance版の処理中にエラーが発生しました: {e_yf}")
@@ -88,17 +544,11 @@ def main_logic() -> None:  # 関数名を変更して __main__ ブロックの
                 f"日付: {calculated_date}\n"
                 f"エラータイプ: {type(e_yf).__name__}\n"
                 f"エラーメッセージ: {str(e_yf)}\n"
-                f"--- トレースバック --- \n```{tb_str_yf}```"
+                f"--- トレースバック --- \n```\n{tb_str_yf}```"
+            )
+            notices.append(
+                f"🛑 yfinanceフォールバック処理エラー通知 🛑\n{yfinance_error_message}"
             )
-            if DISCORD_WEBHOOK_URL:
-                send_to_discord(
-                    f"🛑 yfinanceフォールバック処理エラー通知 🛑\n{yfinance_error_message}",
-                    username="エラー通知ナカヤマ",
-                )
-            else:
-                print(
-                    "Discord Webhook URL未設定のため、yfinanceフォールバックエラー通知はスキップされました。"
-                )
 
             # yfinanceも失敗した場合の最終メッセージを設定
             if (
@@ -106,42 +556,131 @@ def main_logic() -> None:  # 関数名を変更して __main__ ブロックの
             ):  # まだfinal_summaryが設定されていなければ (Geminiが成功していたケースは除く)
                 final_summary = f"{calculated_date} の金融市場サマリーは取得できませんでした (Geminiエラー、yfinanceもエラー)。"
 
-    # 3. 最終的なサマリーをDiscordに送信
-    if final_summary:
-        if DISCORD_WEBHOOK_URL:
-            print("\n--- 最終サマリーをDiscordに送信 ---")
-            send_to_discord(final_summary, username="ナカヤマ")
-        else:
-            print("\n--- 最終サマリー (コンソール表示のみ) ---")
-            print(final_summary)
-            print(
-                "Discord Webhook URL未設定のため、最終サマリーのDiscord送信はスキップされました。"
-            )
-    else:
-        # このelseブロックは、Geminiもyfinanceもデータを返さず、かつエラーメッセージも特になかった稀なケース
-        # (例: Geminiが正常にNoneを返し、error_message_for_discordも設定されなかった場合)
-        no_summary_message = (
-            f"{calculated_date} の金融市場サマリーは取得できませんでした。"
+    if error_message_for_discord:
+        metrics.end_span(fallback_phase, succeeded=final_summary is not None)
+
+    return final_summary, summary_already_posted, error_message_for_discord, summary_generated
+
+
+def warm_up_clients() -> None:
+    """常駐モードの起動時に、実行をまたいで使い回すクライアントを先に用意しておく関数。
+
+    Geminiクライアント、Discord送信用のHTTPセッション、yfinance / pandas のインポートを
+    ここで済ませ、各レポートの所要時間をAPI呼び出しそのものに近づける。
+    """
+    with metrics.span("main.warm_up"):
+        if GOOGLE_API_KEY:
+            get_gemini_client()
+        get_default_sender()
+        get_provider("pandas")
+        get_provider("yfinance")
+
+
+def run_scheduled_reports(
+    bypass_cache: bool = GEMINI_CACHE_BYPASS,
+    streaming: bool = GEMINI_STREAMING,
+    max_runs: int | None = None,
+) -> None:
+    """常駐モード。スケジュールごとの時刻に main_logic を実行し続ける関数。"""
+    schedules = get_report_schedules()
+    for schedule in schedules:
+        print(
+            f"スケジュール: {schedule.name} {schedule.time.strftime('%H:%M')} "
+            f"({schedule.timezone}) 指標 {len(schedule.market_instruments)} 件"
         )
-        if not error_message_for_discord:  # まだエラーメッセージが設定されていなければ
-            if DISCORD_WEBHOOK_URL:
-                send_to_discord(f"ℹ️ {no_summary_message}", username="ナカヤマ")
-            else:
-                print(f"ℹ️ {no_summary_message} (Discord通知スキップ)")
-        print(no_summary_message)  # コンソールには必ず表示
+    warm_up_clients()
+    try:
+        run_daemon(
+            schedules,
+            lambda schedule, run_at: main_logic(
+                bypass_cache=bypass_cache,
+                streaming=streaming,
+                schedule=schedule,
+                run_at=run_at,
+            ),
+            max_runs=max_runs,
+        )
+    except KeyboardInterrupt:
+        print("常駐モードを終了します。")
+    finally:
+        get_default_sender().close()
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="金融市場サマリーをDiscordに投稿します。")
+    parser.add_argument(
+        "--profile-imports",
+        action="store_true",
+        help="起動時のインポート所要時間の内訳を表示して終了します。",
+    )
+    parser.add_argument(
+        "--bypass-cache",
+        action="store_true",
+        help="Gemini応答キャッシュを読まずにAPIを呼び出します。",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Geminiの応答をストリーミングで受け取り、Discordのメッセージを逐次更新します。",
+    )
+    parser.add_argument(
+        "--backfill",
+        nargs=2,
+        metavar=("START", "END"),
+        type=datetime.date.fromisoformat,
+        help="START から END (YYYY-MM-DD、両端を含む) のサマリーをバッチで生成して投稿します。",
+    )
+    parser.add_argument(
+        "--batch-file",
+        default=os.path.join(CACHE_DIR, "backfill", "requests.jsonl"),
+        help="バックフィル用のバッチリクエストを書き出すJSONLファイル。",
+    )
+    parser.add_argument(
+        "--local-batch",
+        action="store_true",
+        help="バッチジョブを使わず、バックフィルのリクエストを手元で1件ずつ実行します。",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="常駐し、REPORT_SCHEDULES のスケジュールごとにサマリーを投稿し続けます。",
+    )
+    parser.add_argument(
+        "--metrics-report",
+        action="store_true",
+        help="計測履歴 (METRICS_JSONL_PATH) から処理段階ごとの p50/p95 を表示して終了します。",
+    )
+    args = parser.parse_args()
+
+    if args.metrics_report:
+        history = metrics.summarize_history(METRICS_JSONL_PATH)
+        if not history:
+            print(f"計測履歴がありません (METRICS_JSONL_PATH: {METRICS_JSONL_PATH or '未設定'})。")
+        for stage, summary in history.items():
+            print(
+                f"{stage}: 件数 {summary['count']}, "
+                f"p50 {summary['p50_ms']:.1f} ms, p95 {summary['p95_ms']:.1f} ms"
+            )
+        raise SystemExit(0)
+
+    if args.profile_imports:
+        from startup_profiler import profile_imports, profile_providers
+
+        print(profile_imports("main"))
+        print(profile_providers())
+        raise SystemExit(0)
+
     # 起動時の環境変数チェック
     can_proceed = True
-    if not DISCORD_WEBHOOK_URL and not GOOGLE_API_KEY:
+    has_webhook_targets = bool(get_webhook_targets())
+    if not has_webhook_targets and not GOOGLE_API_KEY:
         print(
-            "エラー: 環境変数 'DISCORD_WEBHOOK_URL' および 'GOOGLE_API_KEY' が両方とも設定されていません。処理を中止します。"
+            "エラー: 環境変数 'DISCORD_WEBHOOK_URL' (または 'DISCORD_WEBHOOK_TARGETS') および 'GOOGLE_API_KEY' が両方とも設定されていません。処理を中止します。"
         )
         can_proceed = False
-    elif not DISCORD_WEBHOOK_URL:
+    elif not has_webhook_targets:
         print(
-            "警告: 環境変数 'DISCORD_WEBHOOK_URL' が設定されていません。Discordへの通知は行われません。"
+            "警告: 環境変数 'DISCORD_WEBHOOK_URL' (または 'DISCORD_WEBHOOK_TARGETS') が設定されていません。Discordへの通知は行われません。"
         )
     elif not GOOGLE_API_KEY:
         # Geminiクライアントの初期化はgemini_handlerで行われるが、キーがない時点で警告
@@ -149,9 +688,22 @@ if __name__ == "__main__":
             "警告: 環境変数 'GOOGLE_API_KEY' が設定されていません。Gemini APIを利用した処理はスキップされます。"
         )
 
-    if can_proceed:
+    if can_proceed and args.backfill:
+        from backfill import GeminiBatchRunner, LocalBatchRunner, run_backfill
+
+        runner = LocalBatchRunner() if args.local_batch else GeminiBatchRunner()
+        run_backfill(args.backfill[0], args.backfill[1], runner, args.batch_file)
+    elif can_proceed and args.daemon:
+        run_scheduled_reports(
+            bypass_cache=args.bypass_cache or GEMINI_CACHE_BYPASS,
+            streaming=args.stream or GEMINI_STREAMING,
+        )
+    elif can_proceed:
         # 主要な環境変数チェックは各モジュールのインポート時やメインロジック開始前に行う
         # 例えば config.py が読み込まれた時点で DISCORD_WEBHOOK_URL がなければ discord_sender は機能しないなど。
-        # gemini_handler.py でも GOOGLE_API_KEY がなければ gemini_api_client は None になる。
+        # gemini_handler.py でも GOOGLE_API_KEY がなければ get_gemini_client() は None を返す。
         # ここでは、致命的なケース（両方ない）のみ起動を止め、それ以外は警告に留めて処理を試みる。
-        main_logic()
+        main_logic(
+            bypass_cache=args.bypass_cache or GEMINI_CACHE_BYPASS,
+            streaming=args.stream or GEMINI_STREAMING,
+        )
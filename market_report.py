@@ -0,0 +1,127 @@
+import json
+import re
+from dataclasses import dataclass, field
+
+from config import MARKET_INSTRUMENTS
+from yfinance_handler import calculate_change_percent
+
+
+@dataclass
+class InstrumentQuote:
+    """1指標分の終値と前日終値。"""
+
+    id: str
+    name: str
+    close: float | None
+    previous_close: float | None
+    currency_symbol: str = ""
+    decimals: int = 2
+
+    @property
+    def change_percent(self) -> float | None:
+        return calculate_change_percent(self.close, self.previous_close)
+
+
+@dataclass
+class MarketReport:
+    """金融市場サマリーのデータモデル。Markdownへの整形は render_market_report で行う。"""
+
+    date: str
+    instruments: list[InstrumentQuote]
+    headlines: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+
+
+def _to_float(value) -> float | None:
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, str):
+        value = value.replace(",", "").strip()
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_market_report(
+    text: str, date_str: str, instruments: list[tuple] = MARKET_INSTRUMENTS
+) -> MarketReport:
+    """Geminiが返したJSONテキストを MarketReport に変換する関数。
+
+    コードブロックで囲まれていても読み取る。JSONとして解釈できない場合は ValueError を送出する。
+    指標は instruments (既定は MARKET_INSTRUMENTS) の並びに揃え、応答に含まれない指標は値なしとして扱う。
+    """
+    match = re.search(r"\{.*\}", text, re.DOTALL)
+    if not match:
+        raise ValueError("Geminiの応答にJSONオブジェクトが含まれていません。")
+    data = json.loads(match.group(0))
+    if not isinstance(data, dict):
+        raise ValueError("Geminiの応答JSONがオブジェクトではありません。")
+
+    values: dict[str, dict] = {}
+    for item in data.get("instruments") or []:
+        if isinstance(item, dict) and item.get("id"):
+            values[str(item["id"])] = item
+
+    quotes = []
+    for instrument_id, name, _, currency_symbol, decimals in instruments:
+        item = values.get(instrument_id, {})
+        quotes.append(
+            InstrumentQuote(
+                id=instrument_id,
+                name=name,
+                close=_to_float(item.get("close")),
+                previous_close=_to_float(item.get("previous_close")),
+                currency_symbol=currency_symbol,
+                decimals=decimals,
+            )
+        )
+    headlines = [str(h).strip() for h in data.get("headlines") or [] if str(h).strip()]
+    return MarketReport(date=date_str, instruments=quotes, headlines=headlines)
+
+
+def cross_validate(
+    report: MarketReport,
+    reference_prices: dict[str, tuple[float | None, float | None]],
+    tolerance_percent: float,
+) -> list[str]:
+    """レポートの終値をyfinanceの終値 {ティッカー: (終値, 前日終値)} と突き合わせ、
+    許容乖離率を超えた指標の警告メッセージを返す関数。"""
+    tickers = {instrument_id: ticker for instrument_id, _, ticker, _, _ in MARKET_INSTRUMENTS}
+    warnings = []
+    for quote in report.instruments:
+        reference, _ = reference_prices.get(tickers.get(quote.id, ""), (None, None))
+        if quote.close is None or not reference:
+            continue
+        deviation = (quote.close - reference) / reference * 100
+        if abs(deviation) > tolerance_percent:
+            warnings.append(
+                f"{quote.name}: Gemini {quote.close:,.{quote.decimals}f} / "
+                f"yfinance {reference:,.{quote.decimals}f} (乖離 {deviation:+.2f}%)"
+            )
+    return warnings
+
+
+def render_market_report(report: MarketReport) -> str:
+    """MarketReport をDiscord用のMarkdownに整形する関数。騰落率はここで計算する。"""
+    lines = [f"**{report.date} の金融市場サマリー**", ""]
+    for quote in report.instruments:
+        if quote.close is None:
+            lines.append(f"- {quote.name}: N/A (前日比 N/A)")
+            continue
+        change = quote.change_percent
+        change_text = f"{change:+.2f}%" if change is not None else "N/A"
+        lines.append(
+            f"- {quote.name}: {quote.currency_symbol}{quote.close:,.{quote.decimals}f} (前日比 {change_text})"
+        )
+
+    lines += ["", "**主要ニュースヘッドライン:**"]
+    if report.headlines:
+        lines += [f"- {headline}" for headline in report.headlines]
+    else:
+        lines.append("- N/A")
+
+    if report.warnings:
+        lines += ["", "**⚠️ yfinanceとの価格差異:**"]
+        lines += [f"- {warning}" for warning in report.warnings]
+    return "\n".join(lines)
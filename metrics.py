@@ -0,0 +1,223 @@
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+from typing import Iterator
+
+# 1回の実行中に記録した計測結果。emit_metrics で書き出してからリセットする
+_records: list[dict] = []
+_counters: dict[tuple[str, str], float] = {}
+_lock = threading.Lock()
+_run_started_at = time.time()
+# reset のたびに増える実行の番号。前の実行から残ったスレッドの記録を捨てるために使う
+_run_generation = 0
+_thread_run = threading.local()
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def current_run() -> int:
+    """現在の実行の番号を返す関数。別スレッドで bind_run に渡す。"""
+    return _run_generation
+
+
+def bind_run(run: int) -> None:
+    """このスレッドの計測を run 番の実行のものとする関数。
+
+    制限時間を過ぎても動き続けるスレッドが、reset (次の実行) の後に記録しないようにする。
+    """
+    _thread_run.value = run
+
+
+def _this_run() -> int:
+    return getattr(_thread_run, "value", _run_generation)
+
+
+def start_span(stage: str, **fields) -> dict:
+    """処理区間の計測を開始し、end_span に渡すレコードを返す関数。"""
+    return {"stage": stage, **fields, "_started_at": time.perf_counter(), "_run": _this_run()}
+
+
+def elapsed_ms(record: dict) -> float:
+    """start_span で開始した計測の経過時間(ms)を返す関数。"""
+    return round((time.perf_counter() - record.get("_started_at", time.perf_counter())) * 1000, 2)
+
+
+def end_span(record: dict, **fields) -> None:
+    """start_span で開始した計測を終了して記録する関数。"""
+    started_at = record.pop("_started_at", None)
+    run = record.pop("_run", _run_generation)
+    if started_at is None:
+        return  # 記録済み
+    record.update(fields)
+    record["duration_ms"] = round((time.perf_counter() - started_at) * 1000, 2)
+    record["ts"] = _now_ms()
+    with _lock:
+        if run == _run_generation:  # 前の実行で始まった区間は捨てる
+            _records.append(record)
+
+
+@contextlib.contextmanager
+def span(stage: str, **fields) -> Iterator[dict]:
+    """処理区間の所要時間を計測するコンテキストマネージャー。
+
+    with span("gemini") as s: の s に項目を追加すると一緒に記録される。例外が起きた場合は
+    error に例外の型名を入れて記録し、例外はそのまま送出する。
+    """
+    record = start_span(stage, **fields)
+    try:
+        yield record
+    except BaseException as e:
+        record.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        end_span(record)
+
+
+def increment(name: str, value: float = 1, label: str = "") -> None:
+    """リトライ回数やHTTPステータスなどのカウンターを加算する関数。"""
+    run = _this_run()
+    with _lock:
+        if run == _run_generation:
+            _counters[(name, label)] = _counters.get((name, label), 0) + value
+
+
+def record_token_usage(stage: str, response) -> None:
+    """Geminiのレスポンスの usage_metadata からトークン使用量を記録する関数。"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    for field in ("prompt_token_count", "candidates_token_count", "total_token_count"):
+        value = getattr(usage, field, None)
+        if isinstance(value, int):
+            increment(f"gemini_{field}", value, label=stage)
+
+
+def get_records() -> list[dict]:
+    with _lock:
+        return list(_records)
+
+
+def get_counters() -> dict[tuple[str, str], float]:
+    with _lock:
+        return dict(_counters)
+
+
+def reset() -> None:
+    """計測結果を破棄し、次の実行の計測を始める。"""
+    global _run_started_at, _run_generation
+    with _lock:
+        _records.clear()
+        _counters.clear()
+        _run_started_at = time.time()
+        _run_generation += 1
+
+
+def write_json_lines(path: str, run_id: str = "") -> None:
+    """計測結果を1行1レコードのJSONとして追記する関数。実行をまたいだ履歴になる。"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    run_id = run_id or str(int(_run_started_at))
+    with open(path, "a", encoding="utf-8") as f:
+        for record in get_records():
+            f.write(json.dumps({"run_id": run_id, **record}, ensure_ascii=False) + "\n")
+        for (name, label), value in sorted(get_counters().items()):
+            counter = {"run_id": run_id, "counter": name, "label": label, "value": value}
+            f.write(json.dumps(counter, ensure_ascii=False) + "\n")
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_prometheus_textfile(path: str) -> None:
+    """node_exporter の textfile collector 形式で、直近の実行の計測結果を書き出す関数。"""
+    durations: dict[str, float] = {}
+    errors: dict[str, int] = {}
+    for record in get_records():
+        stage = record["stage"]
+        durations[stage] = durations.get(stage, 0.0) + record["duration_ms"] / 1000
+        if "error" in record:
+            errors[stage] = errors.get(stage, 0) + 1
+
+    lines = [
+        "# HELP discord_bot_stage_duration_seconds 直近の実行での処理段階ごとの所要時間",
+        "# TYPE discord_bot_stage_duration_seconds gauge",
+    ]
+    for stage, seconds in sorted(durations.items()):
+        lines.append(
+            f'discord_bot_stage_duration_seconds{{stage="{_escape_label(stage)}"}} {seconds:.6f}'
+        )
+    lines += [
+        "# HELP discord_bot_stage_errors 直近の実行での処理段階ごとのエラー件数",
+        "# TYPE discord_bot_stage_errors gauge",
+    ]
+    for stage, count in sorted(errors.items()):
+        lines.append(f'discord_bot_stage_errors{{stage="{_escape_label(stage)}"}} {count}')
+
+    counter_names = sorted({name for name, _ in get_counters()})
+    for name in counter_names:
+        lines.append(f"# TYPE discord_bot_{name} gauge")
+        for (counter_name, label), value in sorted(get_counters().items()):
+            if counter_name == name:
+                lines.append(f'discord_bot_{name}{{label="{_escape_label(label)}"}} {value:g}')
+    lines.append("# TYPE discord_bot_last_run_timestamp_seconds gauge")
+    lines.append(f"discord_bot_last_run_timestamp_seconds {_run_started_at:.0f}")
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # textfile collector が書きかけのファイルを読まないように置き換えで書き出す
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
+
+
+def summarize_history(path: str) -> dict[str, dict[str, float]]:
+    """JSON Lines の履歴から、処理段階ごとの件数と p50 / p95 (ms) を計算する関数。
+
+    履歴のファイルがない (まだ一度も書き出していない) 場合は空の辞書を返す。
+    """
+    durations: dict[str, list[float]] = {}
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "stage" in record and "duration_ms" in record:
+                durations.setdefault(record["stage"], []).append(record["duration_ms"])
+
+    def percentile(values: list[float], q: float) -> float:
+        # 最近傍法 (nearest-rank)
+        ordered = sorted(values)
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+    return {
+        stage: {
+            "count": len(values),
+            "p50_ms": percentile(values, 50),
+            "p95_ms": percentile(values, 95),
+        }
+        for stage, values in sorted(durations.items())
+    }
+
+
+def emit_metrics(jsonl_path: str, prometheus_path: str) -> None:
+    """設定された出力先に計測結果を書き出し、計測をリセットする関数。"""
+    try:
+        if jsonl_path:
+            write_json_lines(jsonl_path)
+        if prometheus_path:
+            write_prometheus_textfile(prometheus_path)
+    except OSError as e:
+        print(f"計測結果の書き出しに失敗しました: {e}")
+    finally:
+        reset()
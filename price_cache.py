@@ -0,0 +1,96 @@
+import datetime
+import os
+import sqlite3
+import time
+
+
+class PriceCache:
+    """ティッカー・日付をキーに終値を保存するSQLiteベースのローカルキャッシュ。
+
+    prices テーブルに日足の終値を、refresh テーブルにティッカーごとの最終取得時刻と
+    キャッシュがカバーしている開始日を保持する。
+    """
+
+    def __init__(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS prices ("
+            " ticker TEXT NOT NULL, date TEXT NOT NULL, close REAL NOT NULL,"
+            " PRIMARY KEY (ticker, date))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS refresh ("
+            " ticker TEXT PRIMARY KEY, fetched_at REAL NOT NULL, covered_since TEXT NOT NULL)"
+        )
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def last_date(self, ticker: str) -> datetime.date | None:
+        """キャッシュ済みの最新バーの日付を返す。"""
+        row = self.conn.execute(
+            "SELECT MAX(date) FROM prices WHERE ticker = ?", (ticker,)
+        ).fetchone()
+        return datetime.date.fromisoformat(row[0]) if row and row[0] else None
+
+    def covered_since(self, ticker: str) -> datetime.date | None:
+        """キャッシュがどの日付以降を取得済みとして扱えるかを返す。"""
+        row = self.conn.execute(
+            "SELECT covered_since FROM refresh WHERE ticker = ?", (ticker,)
+        ).fetchone()
+        return datetime.date.fromisoformat(row[0]) if row else None
+
+    def is_fresh(self, ticker: str, ttl_seconds: float) -> bool:
+        """最終取得からTTL以内であれば True を返す。"""
+        row = self.conn.execute(
+            "SELECT fetched_at FROM refresh WHERE ticker = ?", (ticker,)
+        ).fetchone()
+        return bool(row) and time.time() - row[0] < ttl_seconds
+
+    def store(
+        self,
+        ticker: str,
+        closes: list[tuple[datetime.date, float]],
+        fetched_since: datetime.date,
+    ) -> None:
+        """取得した終値を保存し、取得時刻とカバー範囲を更新する。"""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO prices (ticker, date, close) VALUES (?, ?, ?)",
+            [(ticker, date.isoformat(), close) for date, close in closes],
+        )
+        covered_since = self.covered_since(ticker)
+        if covered_since is None or fetched_since < covered_since:
+            covered_since = fetched_since
+        self.conn.execute(
+            "INSERT OR REPLACE INTO refresh (ticker, fetched_at, covered_since) VALUES (?, ?, ?)",
+            (ticker, time.time(), covered_since.isoformat()),
+        )
+        self.conn.commit()
+
+    def load(
+        self, ticker: str, since: datetime.date | None = None
+    ) -> list[tuple[datetime.date, float]]:
+        """指定日以降の終値を日付順に返す。"""
+        rows = self.conn.execute(
+            "SELECT date, close FROM prices WHERE ticker = ? AND date >= ? ORDER BY date",
+            (ticker, since.isoformat() if since else ""),
+        ).fetchall()
+        return [(datetime.date.fromisoformat(date), close) for date, close in rows]
+
+    def evict(self, retention_days: int) -> int:
+        """保持期間より古いバーを削除し、削除件数を返す。"""
+        cutoff = datetime.date.today() - datetime.timedelta(days=retention_days)
+        cursor = self.conn.execute(
+            "DELETE FROM prices WHERE date < ?", (cutoff.isoformat(),)
+        )
+        self.conn.execute(
+            "UPDATE refresh SET covered_since = ? WHERE covered_since < ?",
+            (cutoff.isoformat(), cutoff.isoformat()),
+        )
+        self.conn.commit()
+        return cursor.rowcount
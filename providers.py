@@ -0,0 +1,51 @@
+import importlib
+import threading
+import time
+from typing import Any, Callable
+
+# 名前 -> 生成関数。生成は get_provider の初回呼び出しまで遅延される
+_factories: dict[str, Callable[[], Any]] = {}
+_instances: dict[str, Any] = {}
+_load_seconds: dict[str, float] = {}
+_lock = threading.RLock()
+
+
+def register_provider(name: str, factory: Callable[[], Any]) -> None:
+    """遅延生成するオブジェクトの生成関数を登録する関数。"""
+    with _lock:
+        _factories[name] = factory
+        _instances.pop(name, None)
+
+
+def register_module_provider(name: str, module_name: str) -> None:
+    """初回利用時にインポートするモジュールを登録する関数。"""
+    register_provider(name, lambda: importlib.import_module(module_name))
+
+
+def get_provider(name: str) -> Any:
+    """登録済みのオブジェクトを返す。初回呼び出し時に生成し、以降は同じものを返す。
+
+    生成関数が None を返した (クライアントの作成に失敗した) 場合は保持せず、次回また生成する。
+    """
+    with _lock:
+        if name in _instances:
+            return _instances[name]
+        if name not in _factories:
+            raise KeyError(f"未登録のプロバイダーです: {name}")
+        started_at = time.perf_counter()
+        instance = _factories[name]()
+        _load_seconds[name] = time.perf_counter() - started_at
+        if instance is not None:
+            _instances[name] = instance
+        return instance
+
+
+def get_provider_load_times() -> dict[str, float]:
+    """これまでに生成したプロバイダーごとの生成所要時間(秒)を返す。"""
+    with _lock:
+        return dict(_load_seconds)
+
+
+register_module_provider("yfinance", "yfinance")
+register_module_provider("pandas", "pandas")
+register_module_provider("numpy", "numpy")
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import os
+import time
+
+
+class ResponseCache:
+    """キーのハッシュをファイル名にして応答テキストを保存するディスクキャッシュ。
+
+    1エントリ = 1つのJSONファイル。TTLを過ぎたエントリは読み込み時に無視され、
+    合計サイズが上限を超えた場合は古いものから削除される。
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float, max_bytes: int) -> None:
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """キーの構成要素から内容アドレス (SHA-256) を作る。"""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> str | None:
+        """TTL内のエントリがあれば応答テキストを返す。"""
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            return None
+        return entry.get("text")
+
+    def put(self, key: str, text: str, **metadata: str) -> None:
+        """応答テキストを保存し、サイズ上限に収まるよう古いエントリを削除する。"""
+        os.makedirs(self.directory, exist_ok=True)
+        entry = {"created_at": time.time(), "text": text, **metadata}
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self) -> int:
+        """期限切れのエントリと、サイズ上限を超えた分の古いエントリを削除し、削除件数を返す。"""
+        try:
+            names = [n for n in os.listdir(self.directory) if n.endswith(".json")]
+        except OSError:
+            return 0
+        files = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        removed = 0
+        now = time.time()
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in sorted(files):  # 古い順
+            if now - mtime <= self.ttl_seconds and total <= self.max_bytes:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
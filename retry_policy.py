@@ -0,0 +1,212 @@
+import json
+import math
+import os
+import random
+import time
+from typing import Callable, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+# 一時的な障害とみなすHTTPステータス
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# requests / httpx の接続・タイムアウト系の例外名 (ライブラリをインポートせずに判定する)
+_TRANSIENT_ERROR_NAMES = {
+    "ConnectionError",
+    "ConnectError",
+    "ConnectTimeout",
+    "ReadTimeout",
+    "WriteTimeout",
+    "PoolTimeout",
+    "ReadError",
+    "RemoteProtocolError",
+    "ChunkedEncodingError",
+    "Timeout",
+}
+
+# リクエストを送る前 (接続の確立まで) に失敗したことを表す例外名。
+# 読み取りタイムアウトなどと違い、サーバー側では何も処理されていない
+_NOT_SENT_ERROR_NAMES = {
+    "ConnectError",
+    "ConnectTimeout",
+    "ConnectTimeoutError",
+    "ConnectionRefusedError",
+    "NewConnectionError",
+}
+
+
+class RetryPolicy:
+    """ジッター付き指数バックオフの再試行ポリシー。"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 20.0,
+        jitter: float = 0.5,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def backoff(self, attempt: int) -> float:
+        """attempt 回目の失敗後に待つ秒数。上限付きの指数に、最大 jitter 割の揺らぎを加える。"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+
+class Deadline:
+    """1回の実行全体の締め切り。seconds が None なら締め切りなし。"""
+
+    def __init__(self, seconds: float | None) -> None:
+        self.expires_at = time.monotonic() + seconds if seconds is not None else math.inf
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+_run_deadline = Deadline(None)
+
+
+def start_run_deadline(seconds: float | None) -> Deadline:
+    """この実行の締め切りを設定する関数。以降の再試行はこの残り時間の範囲で行われる。"""
+    global _run_deadline
+    _run_deadline = Deadline(seconds)
+    return _run_deadline
+
+
+def get_run_deadline() -> Deadline:
+    return _run_deadline
+
+
+def is_transient_error(e: BaseException) -> bool:
+    """接続エラー・タイムアウト・一時的なHTTPステータスなら True を返す関数。"""
+    status = getattr(e, "code", None)
+    response = getattr(e, "response", None)
+    if not isinstance(status, int) and response is not None:
+        status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES
+    if isinstance(e, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in _TRANSIENT_ERROR_NAMES for cls in type(e).__mro__)
+
+
+def is_safe_to_resend(e: BaseException) -> bool:
+    """冪等でないリクエスト (POST) を再送してよいエラーなら True を返す関数。
+
+    一時的なHTTPステータスの応答と、リクエストを送る前の接続エラーだけを対象にする。
+    読み取りタイムアウトや応答の途中切断では、サーバー側でメッセージが作成済みのことが多く、
+    再送すると二重投稿になるため再試行しない。
+    """
+    status = getattr(e, "code", None)
+    response = getattr(e, "response", None)
+    if not isinstance(status, int) and response is not None:
+        status = getattr(response, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES
+    # requests は名前解決や接続拒否も ConnectionError で包むので、原因の例外も確認する
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return any(
+        cls.__name__ in _NOT_SENT_ERROR_NAMES
+        for error in (e, reason)
+        if error is not None
+        for cls in type(error).__mro__
+    )
+
+
+def call_with_retry(
+    func: Callable[[], T],
+    policy: RetryPolicy,
+    is_retryable: Callable[[BaseException], bool] = is_transient_error,
+    deadline: Deadline | None = None,
+    name: str = "",
+    sleep: Callable[[float], None] = time.sleep,
+) -> T:
+    """func を呼び出し、再試行可能なエラーならバックオフして再試行する関数。
+
+    再試行できないエラー、試行回数の上限、または待ち時間が締め切りまでの残り時間を超える
+    場合は、最後の例外をそのまま送出する。
+    """
+    deadline = deadline or get_run_deadline()
+    attempt = 1
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if not is_retryable(e) or attempt >= policy.max_attempts:
+                raise
+            delay = policy.backoff(attempt)
+            if delay >= deadline.remaining():
+                print(f"{name}: 実行の残り時間が足りないため再試行しません。")
+                raise
+            print(
+                f"{name}: 一時的なエラーのため {delay:.1f} 秒後に再試行します。"
+                f" ({attempt}/{policy.max_attempts - 1}) {type(e).__name__}: {e}"
+            )
+            metrics.increment("retries", label=name)
+            sleep(delay)
+            attempt += 1
+
+
+class CircuitBreaker:
+    """連続した失敗を実行をまたいでファイルに記録し、しきい値を超えたら一定時間呼び出しを止める。
+
+    cooldown_seconds 経過後は1回だけ試行を許し (半開状態)、成功すれば記録をリセットする。
+    """
+
+    def __init__(self, path: str, failure_threshold: int, cooldown_seconds: float) -> None:
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"failures": 0, "last_failure_at": 0.0}
+
+    def _save(self, state: dict) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    def allow(self) -> bool:
+        """呼び出してよければ True。失敗がしきい値以上で、冷却期間中なら False。"""
+        if self.failure_threshold <= 0:
+            return True  # しきい値0以下は無効
+        state = self._load()
+        if state["failures"] < self.failure_threshold:
+            return True
+        return time.time() - state["last_failure_at"] >= self.cooldown_seconds
+
+    def record_success(self) -> None:
+        try:
+            self._save({"failures": 0, "last_failure_at": 0.0})
+        except OSError as e:
+            print(f"サーキットブレーカーの状態を保存できませんでした: {e}")
+
+    def record_failure(self) -> None:
+        state = self._load()
+        # 閉じている間は、冷却期間より前の失敗は数えない
+        # (開いている・半開状態での失敗は数え続け、冷却期間をやり直す)
+        if (
+            state["failures"] < self.failure_threshold
+            and time.time() - state["last_failure_at"] >= self.cooldown_seconds
+        ):
+            state["failures"] = 0
+        state["failures"] += 1
+        state["last_failure_at"] = time.time()
+        try:
+            self._save(state)
+        except OSError as e:
+            print(f"サーキットブレーカーの状態を保存できませんでした: {e}")
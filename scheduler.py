@@ -0,0 +1,155 @@
+import dataclasses
+import datetime
+import json
+import time
+import traceback
+import zoneinfo
+from typing import Callable
+
+from config import GEMINI_PROMPT_TEMPLATES, MARKET_INSTRUMENTS, REPORT_SCHEDULES
+
+# REPORT_SCHEDULES が未設定の場合のスケジュール (東京市場の引け後と米国市場の引け後)
+DEFAULT_REPORT_SCHEDULES: list[dict] = [
+    {
+        "name": "tokyo_close",
+        "time": "15:45",
+        "timezone": "Asia/Tokyo",
+        "prompt": "tokyo_close",
+        "instruments": ["nikkei225", "usdjpy", "eurusd", "btcusd", "xauusd"],
+    },
+    {
+        "name": "us_close",
+        "time": "16:30",
+        "timezone": "America/New_York",
+        "prompt": "default",
+    },
+]
+
+# 長い待機中も時計の変化 (スリープ復帰など) に追従できるよう、この秒数ごとに起きて確認する
+_MAX_SLEEP_SECONDS = 60.0
+
+
+@dataclasses.dataclass(frozen=True)
+class ReportSchedule:
+    """常駐モードで1日1回実行するレポートの設定。
+
+    time と weekdays (月曜=0) は timezone の現地時刻で解釈する。instruments が空なら
+    MARKET_INSTRUMENTS の全指標を使い、prompt は GEMINI_PROMPT_TEMPLATES のキーを指定する。
+    """
+
+    name: str
+    time: datetime.time
+    timezone: str
+    weekdays: tuple[int, ...] = (0, 1, 2, 3, 4)
+    prompt: str = "default"
+    instruments: tuple[str, ...] = ()
+
+    @property
+    def tzinfo(self) -> zoneinfo.ZoneInfo:
+        return zoneinfo.ZoneInfo(self.timezone)
+
+    @property
+    def prompt_template(self) -> str:
+        return GEMINI_PROMPT_TEMPLATES[self.prompt]
+
+    @property
+    def market_instruments(self) -> list[tuple]:
+        """このスケジュールで扱う指標を MARKET_INSTRUMENTS の並びで返す。"""
+        if not self.instruments:
+            return MARKET_INSTRUMENTS
+        return [item for item in MARKET_INSTRUMENTS if item[0] in self.instruments]
+
+    def next_run_after(self, now: datetime.datetime) -> datetime.datetime:
+        """now (タイムゾーン付き) より後で、次にこのスケジュールを実行する日時を返す。"""
+        local_now = now.astimezone(self.tzinfo)
+        for days in range(8):
+            day = local_now.date() + datetime.timedelta(days=days)
+            if day.weekday() not in self.weekdays:
+                continue
+            run_at = datetime.datetime.combine(day, self.time, tzinfo=self.tzinfo)
+            if run_at > local_now:
+                return run_at
+        raise ValueError(f"スケジュール {self.name} に実行する曜日がありません。")
+
+
+def parse_report_schedules(raw: str) -> list[ReportSchedule]:
+    """スケジュール設定 (JSON配列) を ReportSchedule のリストに変換する関数。
+
+    設定が不正な項目は警告を出して読み飛ばす。
+    """
+    try:
+        items = json.loads(raw)
+    except ValueError as e:
+        print(f"警告: REPORT_SCHEDULES をJSONとして解釈できませんでした: {e}")
+        return []
+    if not isinstance(items, list):
+        print("警告: REPORT_SCHEDULES はJSON配列で指定してください。")
+        return []
+
+    known_ids = {item[0] for item in MARKET_INSTRUMENTS}
+    schedules = []
+    for item in items:
+        try:
+            schedule = ReportSchedule(
+                name=str(item["name"]),
+                time=datetime.time.fromisoformat(item["time"]),
+                timezone=str(item.get("timezone", "Asia/Tokyo")),
+                weekdays=tuple(int(d) for d in item.get("weekdays", (0, 1, 2, 3, 4))),
+                prompt=str(item.get("prompt", "default")),
+                instruments=tuple(str(i) for i in item.get("instruments", ())),
+            )
+            schedule.tzinfo  # タイムゾーン名の確認
+        except (KeyError, TypeError, ValueError, zoneinfo.ZoneInfoNotFoundError) as e:
+            print(f"警告: スケジュール設定 {item!r} を読み飛ばします: {e}")
+            continue
+        if schedule.prompt not in GEMINI_PROMPT_TEMPLATES:
+            print(
+                f"警告: スケジュール {schedule.name} のプロンプト {schedule.prompt!r} が"
+                "見つからないため読み飛ばします。"
+            )
+            continue
+        unknown = [i for i in schedule.instruments if i not in known_ids]
+        if unknown:
+            print(f"警告: スケジュール {schedule.name} の未知の指標を無視します: {', '.join(unknown)}")
+        schedules.append(schedule)
+    return schedules
+
+
+def get_report_schedules() -> list[ReportSchedule]:
+    """REPORT_SCHEDULES (未設定なら既定値) からスケジュールを読み込む関数。"""
+    return parse_report_schedules(REPORT_SCHEDULES or json.dumps(DEFAULT_REPORT_SCHEDULES))
+
+
+def run_daemon(
+    schedules: list[ReportSchedule],
+    run_report: Callable[[ReportSchedule, datetime.datetime], None],
+    max_runs: int | None = None,
+    now: Callable[[], datetime.datetime] = lambda: datetime.datetime.now(datetime.timezone.utc),
+    sleep: Callable[[float], None] = time.sleep,
+) -> None:
+    """スケジュールの時刻まで待ち、run_report(スケジュール, 予定時刻) を呼び出し続ける関数。
+
+    1回のレポートで例外が起きても常駐は続ける。処理が長引いて過ぎた予定は実行せず、
+    次の予定まで待つ。max_runs 回実行したら戻る (None なら無期限)。
+    """
+    if not schedules:
+        print("実行するスケジュールがありません。")
+        return
+
+    runs = 0
+    while max_runs is None or runs < max_runs:
+        current = now()
+        run_at, schedule = min(
+            ((s.next_run_after(current), s) for s in schedules), key=lambda x: x[0]
+        )
+        print(f"次の実行: {schedule.name} ({run_at.isoformat()})")
+        while (wait := (run_at - now()).total_seconds()) > 0:
+            sleep(min(wait, _MAX_SLEEP_SECONDS))
+
+        print(f"\n=== スケジュール {schedule.name} の実行を開始 ===")
+        try:
+            run_report(schedule, run_at)
+        except Exception as e:
+            print(f"スケジュール {schedule.name} の実行中にエラーが発生しました: {e}")
+            traceback.print_exc()
+        runs += 1
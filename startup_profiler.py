@@ -0,0 +1,69 @@
+import os
+import subprocess
+import sys
+
+from providers import get_provider, get_provider_load_times
+
+
+def profile_imports(module: str = "main", top: int = 15) -> str:
+    """python -X importtime で module をインポートし、起動時間の内訳をレポートする関数。
+
+    別プロセスで計測するので、現在のプロセスで読み込み済みのモジュールの影響を受けない。
+    どのディレクトリから実行しても module が見つかるよう、このファイルのある場所で実行する。
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    entries: list[tuple[int, int, int, str]] = []  # (深さ, 自身のus, 累積us, モジュール名)
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, int(self_us), int(cumulative_us), name.strip()))
+
+    if completed.returncode != 0:
+        return f"'{module}' のインポートに失敗しました:\n{completed.stderr[-2000:]}"
+
+    # importtime は子モジュールを親より先に出力するので、
+    # 直前のトップレベル行から module の行までにある深さ1の行が module の直接のインポート
+    total_us = 0
+    direct: list[tuple[int, int, int, str]] = []
+    children: list[tuple[int, int, int, str]] = []
+    for entry in entries:
+        if entry[0] == 0:
+            if entry[3] == module:
+                total_us, direct = entry[2], children
+            children = []
+        elif entry[0] == 1:
+            children.append(entry)
+
+    lines = [f"'{module}' のインポート所要時間: {total_us / 1000:.1f} ms"]
+    lines.append(f"\n{module} から直接インポートしているモジュール (累積時間順, 上位{top}件):")
+    for _, _, cumulative_us, name in sorted(direct, key=lambda e: -e[2])[:top]:
+        lines.append(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+    lines.append(f"\n自身の実行時間が大きいモジュール (上位{top}件):")
+    for _, self_us, _, name in sorted(entries, key=lambda e: -e[1])[:top]:
+        lines.append(f"  {self_us / 1000:8.1f} ms  {name}")
+    return "\n".join(lines)
+
+
+def profile_providers(names: tuple[str, ...] = ("numpy", "pandas", "yfinance")) -> str:
+    """遅延インポートしているモジュールを読み込み、それぞれの初回読み込み時間をレポートする関数。
+
+    起動時には含まれず、初めて使うとき (yfinance版の取得など) にかかる時間の目安になる。
+    依存されるものから順に読み込むので、各時間はそれまでに読み込んだ分を除いたものになる。
+    """
+    for name in names:
+        get_provider(name)
+    load_times = get_provider_load_times()
+    lines = ["\n初回利用時まで読み込みを遅らせているモジュール:"]
+    for name in names:
+        lines.append(f"  {load_times.get(name, 0.0) * 1000:8.1f} ms  {name}")
+    return "\n".join(lines)
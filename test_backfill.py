@@ -0,0 +1,72 @@
+import datetime
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from backfill import LocalBatchRunner, parse_batch_results, run_backfill, write_batch_requests
+
+
+class TestBackfill(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, "requests.jsonl")
+
+    def test_write_batch_requests(self):
+        """日付ごとに1行のリクエストが、日付入りのプロンプトで書き出されることをテストします。"""
+        dates = [datetime.date(2024, 5, 9), datetime.date(2024, 5, 10)]
+
+        keys = write_batch_requests(dates, self.path)
+
+        with open(self.path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(keys, ["2024-05-09", "2024-05-10"])
+        self.assertEqual([line["key"] for line in lines], keys)
+        prompt = lines[1]["request"]["contents"][0]["parts"][0]["text"]
+        self.assertIn("日付：2024年05月10日", prompt)
+
+    def test_parse_batch_results(self):
+        """バッチ結果から本文が取り出され、エラーの行は None になることをテストします。"""
+        lines = [
+            json.dumps(
+                {
+                    "key": "2024-05-09",
+                    "response": {"candidates": [{"content": {"parts": [{"text": "サマリー"}]}}]},
+                }
+            ),
+            json.dumps({"key": "2024-05-10", "error": {"code": 500}}),
+        ]
+
+        results = parse_batch_results(lines)
+
+        self.assertEqual(results, {"2024-05-09": "サマリー", "2024-05-10": None})
+
+    def test_run_backfill_posts_in_date_order(self):
+        """ローカル実行の結果が日付順に投稿され、失敗した日は通知に置き換わることをテストします。"""
+
+        def generate(prompt):
+            if "2024年05月10日" in prompt:
+                raise RuntimeError("生成失敗")
+            return prompt.splitlines()[0]
+
+        broadcast = MagicMock(return_value=[])
+        with patch("backfill.get_webhook_targets", return_value=["target"]), patch(
+            "backfill.broadcast_to_discord", broadcast
+        ):
+            run_backfill(
+                datetime.date(2024, 5, 9),
+                datetime.date(2024, 5, 11),
+                LocalBatchRunner(generate),
+                self.path,
+            )
+
+        texts = [c.args[0] for c in broadcast.call_args_list]
+        self.assertEqual(texts[0], "日付：2024年05月09日")
+        self.assertIn("取得できませんでした", texts[1])
+        self.assertEqual(texts[2], "日付：2024年05月11日")
+
+
+if __name__ == "__main__":
+    unittest.main()
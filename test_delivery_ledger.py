@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from delivery_ledger import DeliveryLedger, content_hash
+
+
+class TestDeliveryLedger(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, "deliveries.sqlite3")
+        self.ledger = DeliveryLedger(self.path)
+        self.addCleanup(self.ledger.close)
+
+    def test_complete_only_when_all_targets_delivered(self):
+        """全送信先に同じ本文を配信し終えたときだけ完了とみなされることをテストします。"""
+        urls = ["https://example.com/a", "https://example.com/b"]
+        self.ledger.store_content("2024年05月10日", "default", "サマリー")
+        text_hash = content_hash("サマリー")
+
+        self.ledger.record_delivery("2024年05月10日", urls[0], "default", text_hash, ["1"], True)
+        self.assertFalse(self.ledger.is_complete("2024年05月10日", "default", urls))
+
+        # 投稿済みでも本文が確定していなければ未完了
+        self.ledger.record_delivery("2024年05月10日", urls[1], "default", "", ["2"], False)
+        self.assertFalse(self.ledger.is_complete("2024年05月10日", "default", urls))
+
+        self.ledger.record_delivery("2024年05月10日", urls[1], "default", text_hash, ["2"], True)
+        # 保存内容はファイルに残るので、別インスタンス (次回の実行) でも有効
+        reopened = DeliveryLedger(self.path)
+        self.addCleanup(reopened.close)
+        self.assertTrue(reopened.is_complete("2024年05月10日", "default", urls))
+        self.assertFalse(reopened.is_complete("2024年05月10日", "us_close", urls))
+        self.assertEqual(reopened.get_delivery("2024年05月10日", urls[1], "default").message_ids, ["2"])
+
+    def test_webhook_url_is_not_stored(self):
+        """WebhookのURL (トークン) がそのまま保存されないことをテストします。"""
+        url = "https://discord.com/api/webhooks/1/secret-token"
+        self.ledger.record_delivery("2024年05月10日", url, "default", "hash", ["1"], True)
+
+        with open(self.path, "rb") as f:
+            self.assertNotIn(b"secret-token", f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
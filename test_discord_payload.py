@@ -0,0 +1,100 @@
+import unittest
+
+from discord_payload import (
+    CONTENT_LIMIT,
+    EMBED_DESCRIPTION_LIMIT,
+    EMBEDS_PER_MESSAGE,
+    MESSAGE_EMBED_TOTAL_LIMIT,
+    NOTICE_COLOR,
+    pack_payloads,
+    split_markdown,
+)
+
+
+class TestSplitMarkdown(unittest.TestCase):
+    def test_splits_on_sections_and_bullets(self):
+        """見出しの境目で分割され、箇条書きの項目が途中で切れないことをテストします。"""
+        prices = "**価格**\n" + "\n".join(f"- 指標{i}: 100.00 (前日比 +1.00%)" for i in range(40))
+        news = "**主要ニュースヘッドライン:**\n" + "\n".join(f"- ニュース{i}" for i in range(5))
+
+        chunks = split_markdown(f"{prices}\n{news}", 1200)
+
+        self.assertTrue(all(len(chunk) <= 1200 for chunk in chunks))
+        # 収まるセクションは途中で分割されない
+        self.assertTrue(any(news in chunk for chunk in chunks))
+        lines = [line for chunk in chunks for line in chunk.split("\n")]
+        self.assertEqual(lines, f"{prices}\n{news}".split("\n"))
+
+    def test_long_code_block_is_reopened(self):
+        """長いコードブロックは片ごとにフェンスを閉じ直して分割されることをテストします。"""
+        traceback = "\n".join(f'  File "main.py", line {i}, in main_logic' for i in range(100))
+        text = f"エラーが発生しました。\n```\n{traceback}\n```"
+
+        chunks = split_markdown(text, 1000)
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 1000)
+            self.assertEqual(chunk.count("```") % 2, 0)
+
+    def test_long_line_after_short_lines_stays_within_limit(self):
+        """短い行に続く上限超えの1行が、前の片の残りを超えずに分割されることをテストします。"""
+        bullets = "\n".join(["- a" * 20] * 50)
+        text = f"{bullets}\n{'y' * 5000}\n{bullets}"
+
+        chunks = split_markdown(text, EMBED_DESCRIPTION_LIMIT)
+
+        self.assertTrue(all(len(chunk) <= EMBED_DESCRIPTION_LIMIT for chunk in chunks))
+        self.assertEqual("".join(chunks).count("y"), 5000)
+
+
+class TestPackPayloads(unittest.TestCase):
+    def test_short_text_uses_content(self):
+        """短い本文はこれまでどおり content で送られることをテストします。"""
+        self.assertEqual(pack_payloads("サマリー"), [{"content": "サマリー"}])
+
+    def test_long_text_uses_fewest_messages(self):
+        """長い本文が上限を守りつつ、できるだけ少ないメッセージに詰められることをテストします。"""
+        text = "\n".join(f"- 項目{i}: " + "あ" * 90 for i in range(300))
+
+        payloads = pack_payloads(text)
+
+        self.assertGreater(len(text), CONTENT_LIMIT)
+        for payload in payloads:
+            sizes = [len(embed["description"]) for embed in payload["embeds"]]
+            self.assertLessEqual(len(sizes), EMBEDS_PER_MESSAGE)
+            self.assertLessEqual(sum(sizes), MESSAGE_EMBED_TOTAL_LIMIT)
+        # 行の境目で切る分の余りを除けば、メッセージ数は文字数から決まる最小値になる
+        self.assertEqual(len(payloads), -(-len(text) // MESSAGE_EMBED_TOTAL_LIMIT))
+
+    def test_long_reports_stay_within_discord_limits(self):
+        """長い箇条書き・行・コードブロックを含む本文でも、Discordの上限を超えないことをテストします。"""
+        code = "\n".join("x" * 300 for _ in range(40))
+        texts = [
+            "\n".join(f"**見出し{i}**\n- " + "あ" * 1500 for i in range(8)),
+            "\n".join(f"## 見出し{i}\n- " + "い" * (50 + i * 170) for i in range(11)),
+            "\n".join(["- a" * 20] * 50) + "\n" + "y" * 5000 + f"\n```python\n{code}\n```",
+        ]
+        for text in texts:
+            for notices in ([], ["⚠️ " + "エ" * 3000]):
+                with self.subTest(length=len(text), notices=len(notices)):
+                    payloads = pack_payloads(text, notices)
+
+                    for payload in payloads:
+                        sizes = [len(embed["description"]) for embed in payload["embeds"]]
+                        self.assertLessEqual(len(sizes), EMBEDS_PER_MESSAGE)
+                        self.assertLessEqual(max(sizes), EMBED_DESCRIPTION_LIMIT)
+                        self.assertLessEqual(sum(sizes), MESSAGE_EMBED_TOTAL_LIMIT)
+
+    def test_notices_and_summary_in_one_request(self):
+        """エラー通知とサマリーが1つのリクエストにまとめられることをテストします。"""
+        payloads = pack_payloads("サマリー", notices=["⚠️ エラー通知"])
+
+        self.assertEqual(len(payloads), 1)
+        embeds = payloads[0]["embeds"]
+        self.assertEqual(embeds[0], {"description": "⚠️ エラー通知", "color": NOTICE_COLOR})
+        self.assertEqual(embeds[1], {"description": "サマリー"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from discord_sender import (
+    DiscordWebhookSender,
+    ProgressiveMessage,
+    WebhookTarget,
+    get_webhook_targets,
+)
+
+WEBHOOK_URL = "https://discord.example/api/webhooks/1/token"
+
+
+def make_response(status_code: int, headers: dict | None = None, body: dict | None = None):
+    """requests.Response の代わりになるモックを作るヘルパー。"""
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.json.return_value = body or {}
+    response.raise_for_status.return_value = None
+    return response
+
+
+class FakeClock:
+    """time.monotonic / time.sleep の代わりに使う、sleepで進む時計。"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestDiscordWebhookSender(unittest.TestCase):
+    def setUp(self):
+        self.session = MagicMock()
+        self.clock = FakeClock()
+        self.sender = DiscordWebhookSender(session=self.session)
+        self.sender._clock = self.clock.monotonic
+        self.sender._sleep = self.clock.sleep
+
+    def test_send_reuses_session(self):
+        """複数回の送信で同じセッションが使われることをテストします。"""
+        self.session.post.return_value = make_response(204)
+
+        self.assertEqual(self.sender.send("1通目", url=WEBHOOK_URL), 204)
+        self.assertEqual(self.sender.send("2通目", url=WEBHOOK_URL), 204)
+
+        self.assertEqual(self.session.post.call_count, 2)
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_retry_after_429(self):
+        """429を受けた場合、retry_after だけ待ってから再送されることをテストします。"""
+        self.session.post.side_effect = [
+            make_response(429, body={"retry_after": 1.5, "global": False}),
+            make_response(204),
+        ]
+
+        status = self.sender.send("テスト", url=WEBHOOK_URL)
+
+        self.assertEqual(status, 204)
+        self.assertEqual(self.session.post.call_count, 2)
+        self.assertEqual(self.clock.sleeps, [1.5])
+
+    def test_post_is_not_resent_after_read_timeout(self):
+        """投稿が読み取りタイムアウトになった場合、二重投稿を避けるため再送しないことをテストします。"""
+        self.session.post.side_effect = requests.exceptions.ReadTimeout("timed out")
+
+        self.assertEqual(self.sender.send("テスト", url=WEBHOOK_URL), -1)
+        self.session.post.assert_called_once()
+
+    def test_post_is_resent_after_connect_timeout(self):
+        """接続前のエラーで投稿できなかった場合は再送されることをテストします。"""
+        self.session.post.side_effect = [
+            requests.exceptions.ConnectTimeout("timed out"),
+            make_response(204),
+        ]
+
+        self.assertEqual(self.sender.send("テスト", url=WEBHOOK_URL), 204)
+        self.assertEqual(self.session.post.call_count, 2)
+
+    def test_edit_is_retried_after_read_timeout(self):
+        """メッセージの編集 (PATCH) は読み取りタイムアウトでも再試行されることをテストします。"""
+        self.session.patch.side_effect = [
+            requests.exceptions.ReadTimeout("timed out"),
+            make_response(200),
+        ]
+
+        self.assertEqual(self.sender.edit_message(WEBHOOK_URL, "1", "テスト"), 200)
+        self.assertEqual(self.session.patch.call_count, 2)
+
+    def test_waits_when_bucket_exhausted(self):
+        """バケット残量が0の場合、リセットまで待ってから送信されることをテストします。"""
+        self.session.post.return_value = make_response(
+            204,
+            headers={
+                "X-RateLimit-Bucket": "abc",
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset-After": "2.0",
+            },
+        )
+
+        self.sender.send("1通目", url=WEBHOOK_URL)
+        self.sender.send("2通目", url=WEBHOOK_URL)
+
+        self.assertEqual(self.clock.sleeps, [2.0])
+
+    def test_same_bucket_hash_is_tracked_per_webhook(self):
+        """同じバケットIDを返す別々のWebhookが、残量を共有しないことをテストします。"""
+        other_url = "https://discord.example/api/webhooks/2/token"
+
+        def respond(url, **kwargs):
+            remaining = "4" if url == WEBHOOK_URL else "0"
+            return make_response(
+                204,
+                headers={
+                    "X-RateLimit-Bucket": "same-hash",
+                    "X-RateLimit-Remaining": remaining,
+                    "X-RateLimit-Reset-After": "2.0",
+                },
+            )
+
+        self.session.post.side_effect = respond
+
+        self.sender.send("1通目", url=WEBHOOK_URL)
+        self.sender.send("1通目", url=other_url)
+        self.sender.send("2通目", url=WEBHOOK_URL)
+
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_missing_url_skips_send(self):
+        """Webhook URLがない場合は送信せず -1 を返すことをテストします。"""
+        sender = DiscordWebhookSender(session=self.session)
+        with patch("discord_sender.DISCORD_WEBHOOK_URL", ""):
+            self.assertEqual(sender.send("テスト"), -1)
+        self.session.post.assert_not_called()
+
+    def test_broadcast_applies_per_target_overrides(self):
+        """全送信先に送信され、送信先ごとの username / avatar_url が反映されることをテストします。"""
+        self.session.post.return_value = make_response(204)
+        targets = [
+            WebhookTarget(url=WEBHOOK_URL, name="a"),
+            WebhookTarget(
+                url=WEBHOOK_URL + "2", name="b", username="別名", avatar_url="https://img"
+            ),
+        ]
+
+        results = self.sender.broadcast("サマリー", targets, username="ナカヤマ")
+
+        self.assertEqual([status for _, status in results], [204, 204])
+        payloads = {
+            c.args[0]: c.kwargs["json"] for c in self.session.post.call_args_list
+        }
+        self.assertEqual(payloads[WEBHOOK_URL]["username"], "ナカヤマ")
+        self.assertEqual(payloads[WEBHOOK_URL + "2"]["username"], "別名")
+        self.assertEqual(payloads[WEBHOOK_URL + "2"]["avatar_url"], "https://img")
+
+    def test_get_webhook_targets_merges_sources(self):
+        """DISCORD_WEBHOOK_TARGETS と DISCORD_WEBHOOK_URL が重複なく統合されることをテストします。"""
+        targets_json = '[{"url": "%s", "name": "main"}, "https://other"]' % WEBHOOK_URL
+        with patch("discord_sender.DISCORD_WEBHOOK_TARGETS", targets_json), patch(
+            "discord_sender.DISCORD_WEBHOOK_URL", WEBHOOK_URL
+        ):
+            targets = get_webhook_targets()
+
+        self.assertEqual([t.url for t in targets], [WEBHOOK_URL, "https://other"])
+        self.assertEqual(targets[0].name, "main")
+
+    def test_long_text_and_notices_are_packed(self):
+        """長い本文とエラー通知が、埋め込みに分けて最小限のリクエストで送られることをテストします。"""
+        self.session.post.return_value = make_response(204)
+        text = "\n".join(f"- 項目{i}: " + "あ" * 90 for i in range(100))
+
+        status = self.sender.send(text, url=WEBHOOK_URL, notices=["⚠️ エラー通知"])
+
+        self.assertEqual(status, 204)
+        payloads = [c.kwargs["json"] for c in self.session.post.call_args_list]
+        self.assertEqual(len(payloads), 2)
+        self.assertEqual(payloads[0]["embeds"][0]["description"], "⚠️ エラー通知")
+        sent = "\n".join(
+            embed["description"] for payload in payloads for embed in payload["embeds"]
+        )
+        self.assertEqual(sent, "⚠️ エラー通知\n" + text)
+
+    def test_progressive_message_posts_then_edits(self):
+        """最初の更新で投稿し、間隔内の更新はまとめ、finish で最終テキストが編集されることをテストします。"""
+        self.session.post.return_value = make_response(200, body={"id": "123"})
+        self.session.patch.return_value = make_response(200)
+        message = ProgressiveMessage(
+            self.sender, WebhookTarget(url=WEBHOOK_URL), min_interval=60
+        )
+
+        message.update("価格")
+        message.update("価格リスト")  # 間隔内なので編集されない
+        message.finish("価格リスト\nヘッドライン")
+
+        _, post_kwargs = self.session.post.call_args
+        self.assertEqual(post_kwargs["params"], {"wait": "true"})
+        self.session.patch.assert_called_once()
+        patch_args, patch_kwargs = self.session.patch.call_args
+        self.assertEqual(patch_args[0], f"{WEBHOOK_URL}/messages/123")
+        self.assertEqual(patch_kwargs["json"], {"content": "価格リスト\nヘッドライン"})
+
+
+if __name__ == "__main__":
+    unittest.main()
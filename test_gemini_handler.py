@@ -1,13 +1,20 @@
+import tempfile
 import unittest
 from unittest.mock import patch, MagicMock
 
 # テスト対象のモジュール内の特定の関数や変数をインポート
 # モジュール自体をインポートして属性をパッチする方法も有効です
 from gemini_handler import build_gemini_prompt, get_financial_summary_from_gemini
-import gemini_handler  # gemini_handler.gemini_api_client をパッチするために必要
+import gemini_handler  # gemini_handler.get_gemini_client をパッチするために必要
 
 
 class TestGeminiHandler(unittest.TestCase):
+    def setUp(self):
+        # 応答キャッシュの影響を受けないように無効化しておく
+        patcher = patch.object(gemini_handler, "GEMINI_CACHE_ENABLED", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
     def test_build_gemini_prompt(self):
         """build_gemini_prompt関数が正しくプロンプトを生成するかテストします。"""
         date_str = "2023年10月26日"
@@ -26,10 +33,7 @@ class TestGeminiHandler(unittest.TestCase):
         self.assertIn(expected_substring_instruction, prompt)
         self.assertIn(expected_substring_news, prompt)
 
-    @patch(
-        "gemini_handler.genai.Client"
-    )  # Clientの初期化自体をモックしてAPIキー依存をなくす
-    def test_get_summary_success(self, mock_genai_client_constructor):
+    def test_get_summary_success(self):
         """API呼び出しが成功し、テキストが返されるケースをテストします。"""
         # モックされたGeminiクライアントインスタンスを設定
         mock_client_instance = MagicMock()
@@ -37,8 +41,10 @@ class TestGeminiHandler(unittest.TestCase):
         mock_response.text = "テスト金融サマリー成功"
         mock_client_instance.models.generate_content.return_value = mock_response
 
-        # gemini_handler.gemini_api_client がこのモックインスタンスを指すようにパッチ
-        with patch.object(gemini_handler, "gemini_api_client", mock_client_instance):
+        # gemini_handler.get_gemini_client がこのモックインスタンスを返すようにパッチ
+        with patch.object(
+            gemini_handler, "get_gemini_client", return_value=mock_client_instance
+        ):
             prompt = "テストプロンプト"
             result = get_financial_summary_from_gemini(prompt)
 
@@ -48,22 +54,22 @@ class TestGeminiHandler(unittest.TestCase):
             # args, kwargs = mock_client_instance.models.generate_content.call_args
             # self.assertEqual(kwargs['contents'], prompt)
 
-    @patch("gemini_handler.genai.Client")
-    def test_get_summary_api_error(self, mock_genai_client_constructor):
+    def test_get_summary_api_error(self):
         """API呼び出し中に例外が発生するケースをテストします。"""
         mock_client_instance = MagicMock()
         mock_client_instance.models.generate_content.side_effect = Exception(
             "API呼び出し失敗テスト"
         )
 
-        with patch.object(gemini_handler, "gemini_api_client", mock_client_instance):
+        with patch.object(
+            gemini_handler, "get_gemini_client", return_value=mock_client_instance
+        ):
             prompt = "テストプロンプト"
             with self.assertRaisesRegex(Exception, "API呼び出し失敗テスト"):
                 get_financial_summary_from_gemini(prompt)
             mock_client_instance.models.generate_content.assert_called_once()
 
-    @patch("gemini_handler.genai.Client")
-    def test_get_summary_no_text_response(self, mock_genai_client_constructor):
+    def test_get_summary_no_text_response(self):
         """API応答にテキストが含まれないケースをテストします。"""
         mock_client_instance = MagicMock()
 
@@ -72,7 +78,9 @@ class TestGeminiHandler(unittest.TestCase):
         mock_response_none.text = None
         mock_client_instance.models.generate_content.return_value = mock_response_none
 
-        with patch.object(gemini_handler, "gemini_api_client", mock_client_instance):
+        with patch.object(
+            gemini_handler, "get_gemini_client", return_value=mock_client_instance
+        ):
             result_none = get_financial_summary_from_gemini("プロンプト text is None")
             self.assertIsNone(
                 result_none, "response.textがNoneの場合、Noneが返されるべき"
@@ -81,7 +89,9 @@ class TestGeminiHandler(unittest.TestCase):
         # ケース2: response自体がNone (text属性アクセス前にチェックされるか)
         # generate_content が None を返すことは通常ない想定だが、念のため
         mock_client_instance.models.generate_content.return_value = None
-        with patch.object(gemini_handler, "gemini_api_client", mock_client_instance):
+        with patch.object(
+            gemini_handler, "get_gemini_client", return_value=mock_client_instance
+        ):
             result_response_none = get_financial_summary_from_gemini(
                 "プロンプト response is None"
             )
@@ -96,14 +106,69 @@ class TestGeminiHandler(unittest.TestCase):
             )
 
     def test_get_summary_client_not_initialized(self):
-        """gemini_api_clientがNoneの場合、早期にNoneが返されることをテストします。"""
-        # gemini_handler.gemini_api_client を None としてパッチします
-        with patch.object(gemini_handler, "gemini_api_client", None):
+        """Geminiクライアントが作成できない場合、早期にNoneが返されることをテストします。"""
+        # gemini_handler.get_gemini_client が None を返すようにパッチします
+        with patch.object(
+            gemini_handler, "get_gemini_client", return_value=None
+        ):
             prompt = "テストプロンプト"
             result = get_financial_summary_from_gemini(prompt)
             self.assertIsNone(result)
             # この場合、APIコイル (generate_content) は呼ばれないはずなので、そのチェックは不要
 
+    def test_response_cache(self):
+        """同じプロンプトの2回目はキャッシュから返り、bypass_cache で再取得されることをテストします。"""
+        mock_client_instance = MagicMock()
+        mock_response = MagicMock()
+        mock_response.text = "キャッシュされるサマリー"
+        mock_client_instance.models.generate_content.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmpdir, patch.object(
+            gemini_handler, "GEMINI_CACHE_ENABLED", True
+        ), patch.object(gemini_handler, "CACHE_DIR", tmpdir), patch.object(
+            gemini_handler, "get_gemini_client", return_value=mock_client_instance
+        ):
+            first = get_financial_summary_from_gemini("同じプロンプト")
+            second = get_financial_summary_from_gemini("同じプロンプト")
+            self.assertEqual(first, second)
+            self.assertEqual(mock_client_instance.models.generate_content.call_count, 1)
+
+            get_financial_summary_from_gemini("同じプロンプト", bypass_cache=True)
+            self.assertEqual(mock_client_instance.models.generate_content.call_count, 2)
+
+    def test_invalid_json_reply_is_not_cached(self):
+        """JSON形式で解釈できない応答はキャッシュされず、再実行でAPIが呼び直されることをテストします。"""
+        mock_client_instance = MagicMock()
+        invalid, valid = MagicMock(), MagicMock()
+        invalid.text = "JSONではない文章の応答"
+        valid.text = '{"instruments": [], "headlines": ["ニュース"]}'
+        mock_client_instance.models.generate_content.side_effect = [invalid, valid, valid]
+
+        with tempfile.TemporaryDirectory() as tmpdir, patch.object(
+            gemini_handler, "GEMINI_CACHE_ENABLED", True
+        ), patch.object(gemini_handler, "CACHE_DIR", tmpdir), patch.object(
+            gemini_handler, "get_gemini_client", return_value=mock_client_instance
+        ):
+            with self.assertRaises(ValueError):
+                gemini_handler.get_market_report_from_gemini("2024年05月10日")
+            first = gemini_handler.get_market_report_from_gemini("2024年05月10日")
+            second = gemini_handler.get_market_report_from_gemini("2024年05月10日")
+
+        self.assertEqual(first.headlines, ["ニュース"])
+        self.assertEqual(second.headlines, ["ニュース"])
+        self.assertEqual(mock_client_instance.models.generate_content.call_count, 2)
+
+    def test_client_is_created_lazily(self):
+        """gemini_handlerのインポート時にはgoogle.genaiが読み込まれないことをテストします。"""
+        import subprocess
+        import sys
+
+        code = "import sys, main; print('google.genai' in sys.modules, 'yfinance' in sys.modules)"
+        completed = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        self.assertEqual(completed.stdout.strip().splitlines()[-1], "False False")
+
 
 if __name__ == "__main__":
     unittest.main()
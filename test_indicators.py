@@ -0,0 +1,61 @@
+import math
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from indicators import compute_indicators, pack_latest_bars
+
+
+class TestIndicators(unittest.TestCase):
+    def setUp(self):
+        # 2023-05-12 (金) から 2024-05-10 (金) までの毎日の終値
+        index = pd.date_range(end="2024-05-10", periods=365).date
+        crypto = np.linspace(100.0, 200.0, len(index))
+        stock = pd.Series(np.arange(len(index), dtype=float) + 1000.0, index=index)
+        # 株価指数は土日に値がない
+        stock[[day.weekday() >= 5 for day in index]] = np.nan
+        self.closes = pd.DataFrame({"BTC-USD": crypto, "^GSPC": stock}, index=index)
+
+    def test_pack_latest_bars(self):
+        """欠損を除いた値が元の順序のまま末尾に詰められることをテストします。"""
+        closes = pd.DataFrame({"A": [1.0, np.nan, 2.0], "B": [np.nan, 3.0, np.nan]})
+
+        packed = pack_latest_bars(closes)
+
+        self.assertEqual(packed["A"].tolist()[1:], [1.0, 2.0])
+        self.assertEqual(packed["B"].iloc[-1], 3.0)
+        self.assertTrue(math.isnan(packed["B"].iloc[0]))
+
+    def test_compute_indicators(self):
+        """騰落率・移動平均・52週高安値が、ティッカーごとの取引日で計算されることをテストします。"""
+        result = compute_indicators(self.closes)
+
+        stock = result.loc["^GSPC"]
+        self.assertEqual(stock["close"], 1364.0)
+        # 前日比は直前の営業日 (木曜) と比べる
+        self.assertEqual(stock["previous_close"], 1363.0)
+        # 週次は7暦日前 (前週の金曜) と比べる
+        self.assertAlmostEqual(stock["change_1w"], (1364.0 / 1357.0 - 1) * 100)
+        # 20日線は直近20営業日 (土日を除く) の平均
+        expected_sma20 = self.closes["^GSPC"].dropna().tail(20).mean()
+        self.assertAlmostEqual(stock["sma20"], expected_sma20)
+        self.assertEqual(stock["from_high_52w"], 0.0)
+        # 52週 (364暦日) より前の最初の値は高安値に含めない
+        low_52w = self.closes["BTC-USD"].iloc[1]
+        self.assertAlmostEqual(result.loc["BTC-USD", "low_52w"], low_52w)
+        self.assertAlmostEqual(result.loc["BTC-USD", "from_low_52w"], (200.0 / low_52w - 1) * 100)
+        self.assertGreater(result.loc["BTC-USD", "volatility"], 0.0)
+
+    def test_missing_ticker_is_nan(self):
+        """データのないティッカーの指標は NaN になることをテストします。"""
+        closes = self.closes.assign(**{"^N225": np.nan})
+
+        result = compute_indicators(closes)
+
+        self.assertTrue(result.loc["^N225"].isna().all())
+        self.assertFalse(math.isnan(result.loc["^GSPC", "change_1m"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
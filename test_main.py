@@ -0,0 +1,157 @@
+import datetime
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+import main
+from delivery_ledger import DeliveryLedger, content_hash
+from discord_sender import WebhookTarget
+from scheduler import ReportSchedule
+
+
+class TestMainLogicHedged(unittest.TestCase):
+    def setUp(self):
+        self.release_gemini = threading.Event()
+        self.addCleanup(self.release_gemini.set)
+        self.broadcast = MagicMock(return_value=[])
+        for patcher in (
+            patch("main.GOOGLE_API_KEY", "dummy-key"),
+            patch("main.get_gemini_client", return_value=MagicMock()),
+            patch("main.get_webhook_targets", return_value=["target"]),
+            patch("main.broadcast_to_discord", self.broadcast),
+            patch("main.get_summary_from_yfinance", return_value="yfinance結果\n"),
+            patch("main.METRICS_JSONL_PATH", ""),
+            patch("main.DELIVERY_LEDGER_ENABLED", False),
+            patch("main.get_gemini_circuit_breaker", return_value=MagicMock()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def sent_texts(self) -> list[str]:
+        return [c.args[0] for c in self.broadcast.call_args_list]
+
+    def test_slow_gemini_falls_back_within_budget(self):
+        """Geminiが制限時間内に応答しない場合、先読みしたyfinance版が送信されることをテストします。"""
+
+        gemini_threads = []
+
+        def slow_gemini(prompt, *args, **kwargs):
+            gemini_threads.append(threading.current_thread())
+            self.release_gemini.wait(5)
+            return "Gemini結果"
+
+        with patch("main.get_financial_summary_from_gemini", side_effect=slow_gemini), patch(
+            "main.GEMINI_LATENCY_BUDGET_SECONDS", 0.1
+        ):
+            main.main_logic(hedged=True)
+
+        # エラー通知はyfinance版のサマリーと同じリクエストで送られる
+        self.broadcast.assert_called_once()
+        self.assertIn("yfinance結果", self.sent_texts()[0])
+        self.assertIn("制限時間", self.broadcast.call_args.kwargs["notices"][0])
+        # 制限時間を過ぎたGemini呼び出しがプロセスの終了を妨げないこと
+        self.assertTrue(gemini_threads[0].daemon)
+
+    def test_fast_gemini_is_used(self):
+        """Geminiが制限時間内に応答した場合はその結果が送信されることをテストします。"""
+        with patch("main.get_financial_summary_from_gemini", return_value="Gemini結果"):
+            main.main_logic(hedged=True)
+
+        self.assertEqual(self.sent_texts(), ["Gemini結果"])
+
+    def test_schedule_prompt_and_date(self):
+        """スケジュール実行ではそのプロンプトと、現地時刻での対象日付が使われることをテストします。"""
+        schedule = ReportSchedule(
+            "tokyo_close", datetime.time(15, 45), "Asia/Tokyo", prompt="tokyo_close"
+        )
+        # 2024-05-12 22:00 UTC は東京では 2024-05-13
+        run_at = datetime.datetime(2024, 5, 12, 22, 0, tzinfo=datetime.timezone.utc)
+        gemini = MagicMock(return_value="Gemini結果")
+
+        with patch("main.get_financial_summary_from_gemini", gemini):
+            main.main_logic(hedged=False, streaming=False, schedule=schedule, run_at=run_at)
+
+        prompt = gemini.call_args.args[0]
+        self.assertIn("**2024年05月13日 の東京市場サマリー**", prompt)
+
+
+
+class TestMainLogicLedger(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, "deliveries.sqlite3")
+        self.targets = [
+            WebhookTarget(url="https://example.com/a", name="a"),
+            WebhookTarget(url="https://example.com/b", name="b"),
+        ]
+        self.sender = MagicMock()
+        self.sender.post_messages.side_effect = [["101"], ["102"]]
+        self.sender.edit_messages.return_value = 200
+        self.gemini = MagicMock(return_value="Gemini結果")
+        for patcher in (
+            patch("main.GOOGLE_API_KEY", "dummy-key"),
+            patch("main.get_gemini_client", return_value=MagicMock()),
+            patch("main.get_webhook_targets", return_value=self.targets),
+            patch("main.get_default_sender", return_value=self.sender),
+            patch("main.get_financial_summary_from_gemini", self.gemini),
+            patch("main.get_calculated_date", return_value="2024年05月10日"),
+            patch("main.open_delivery_ledger", side_effect=lambda: DeliveryLedger(self.path)),
+            patch("main.METRICS_JSONL_PATH", ""),
+            patch("main.get_gemini_circuit_breaker", return_value=MagicMock()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_completed_run_exits_before_gemini(self):
+        """配信済みの日付を再実行すると、Geminiも送信も行われないことをテストします。"""
+        main.main_logic(hedged=False, streaming=False)
+        self.assertEqual(self.sender.post_messages.call_count, 2)
+
+        main.main_logic(hedged=False, streaming=False)
+
+        self.gemini.assert_called_once()
+        self.assertEqual(self.sender.post_messages.call_count, 2)
+
+    def test_bypass_cache_regenerates_delivered_run(self):
+        """キャッシュを使わない再実行では、配信済みでも作り直して既存のメッセージを編集することをテストします。"""
+        main.main_logic(hedged=False, streaming=False)
+        self.gemini.return_value = "作り直した結果"
+
+        main.main_logic(hedged=False, bypass_cache=True, streaming=False)
+
+        self.assertEqual(self.gemini.call_count, 2)
+        self.assertEqual(self.sender.post_messages.call_count, 2)
+        self.sender.edit_messages.assert_any_call(self.targets[0].url, ["101"], "作り直した結果")
+        self.sender.edit_messages.assert_any_call(self.targets[1].url, ["102"], "作り直した結果")
+        ledger = DeliveryLedger(self.path)
+        self.addCleanup(ledger.close)
+        self.assertTrue(
+            ledger.is_complete("2024年05月10日", "default", [t.url for t in self.targets])
+        )
+        self.assertEqual(ledger.get_content("2024年05月10日", "default"), "作り直した結果")
+
+    def test_partial_run_resumes_missing_steps(self):
+        """途中まで配信した実行は、保存済みの本文で未完了の送信先だけをやり直すことをテストします。"""
+        ledger = DeliveryLedger(self.path)
+        ledger.store_content("2024年05月10日", "default", "保存済みの結果")
+        # a は配信済み、b は前回の実行で投稿したメッセージが未完了のまま残っている
+        text_hash = content_hash("保存済みの結果")
+        date = "2024年05月10日"
+        ledger.record_delivery(date, self.targets[0].url, "default", text_hash, ["1"], True)
+        ledger.record_delivery(date, self.targets[1].url, "default", "", ["2"], False)
+        ledger.close()
+
+        main.main_logic(hedged=False, streaming=False)
+
+        self.gemini.assert_not_called()
+        self.sender.post_messages.assert_not_called()
+        self.sender.edit_messages.assert_called_once_with(
+            self.targets[1].url, ["2"], "保存済みの結果"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
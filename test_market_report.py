@@ -0,0 +1,58 @@
+import unittest
+
+from market_report import cross_validate, parse_market_report, render_market_report
+
+GEMINI_JSON_RESPONSE = """```json
+{
+  "instruments": [
+    {"id": "sp500", "close": 5100.0, "previous_close": 5000.0},
+    {"id": "usdjpy", "close": "155.5", "previous_close": null}
+  ],
+  "headlines": ["米国株が上昇", "日銀が金利を据え置き"]
+}
+```"""
+
+
+class TestMarketReport(unittest.TestCase):
+    def test_parse_fenced_json(self):
+        """コードブロックで囲まれたJSONが読み取られ、全指標が揃うことをテストします。"""
+        report = parse_market_report(GEMINI_JSON_RESPONSE, "2024年05月10日")
+
+        quotes = {quote.id: quote for quote in report.instruments}
+        self.assertEqual(len(report.instruments), 10)
+        self.assertAlmostEqual(quotes["sp500"].change_percent, 2.0)
+        self.assertEqual(quotes["usdjpy"].close, 155.5)
+        self.assertIsNone(quotes["usdjpy"].change_percent)
+        self.assertIsNone(quotes["nikkei225"].close)
+        self.assertEqual(report.headlines, ["米国株が上昇", "日銀が金利を据え置き"])
+
+    def test_parse_invalid_text(self):
+        """JSONを含まない応答では ValueError が送出されることをテストします。"""
+        with self.assertRaises(ValueError):
+            parse_market_report("本日の市場は堅調でした。", "2024年05月10日")
+
+    def test_render_computes_change_locally(self):
+        """Markdownに騰落率と見出しが含まれることをテストします。"""
+        report = parse_market_report(GEMINI_JSON_RESPONSE, "2024年05月10日")
+
+        text = render_market_report(report)
+
+        self.assertTrue(text.startswith("**2024年05月10日 の金融市場サマリー**"))
+        self.assertIn("- S&P 500: $5,100.00 (前日比 +2.00%)", text)
+        self.assertIn("- 日経平均: N/A (前日比 N/A)", text)
+        self.assertIn("**主要ニュースヘッドライン:**\n- 米国株が上昇", text)
+
+    def test_cross_validate_flags_deviation(self):
+        """許容乖離率を超えた指標だけが警告されることをテストします。"""
+        report = parse_market_report(GEMINI_JSON_RESPONSE, "2024年05月10日")
+
+        warnings = cross_validate(
+            report, {"^GSPC": (5000.0, None), "JPY=X": (155.4, None)}, 1.0
+        )
+
+        self.assertEqual(len(warnings), 1)
+        self.assertIn("S&P 500", warnings[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
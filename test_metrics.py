@@ -0,0 +1,84 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+
+    def test_span_records_error(self):
+        """例外が起きた区間も、エラーの型名付きで記録されることをテストします。"""
+        with self.assertRaises(ValueError):
+            with metrics.span("gemini.generate_content"):
+                raise ValueError("失敗")
+
+        (record,) = metrics.get_records()
+        self.assertEqual(record["stage"], "gemini.generate_content")
+        self.assertEqual(record["error"], "ValueError")
+        self.assertIn("duration_ms", record)
+
+    def test_emit_writes_jsonl_and_prometheus(self):
+        """JSON Lines と Prometheus textfile が書き出され、計測がリセットされることをテストします。"""
+        with metrics.span("discord.send", status=204):
+            pass
+        metrics.increment("discord_http_responses", label="204")
+        jsonl_path = os.path.join(self.tmpdir, "runs.jsonl")
+        prom_path = os.path.join(self.tmpdir, "bot.prom")
+
+        metrics.emit_metrics(jsonl_path, prom_path)
+
+        with open(jsonl_path, encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(lines[0]["stage"], "discord.send")
+        self.assertEqual(lines[1]["counter"], "discord_http_responses")
+        with open(prom_path, encoding="utf-8") as f:
+            prom = f.read()
+        self.assertIn('discord_bot_stage_duration_seconds{stage="discord.send"}', prom)
+        self.assertIn('discord_bot_discord_http_responses{label="204"} 1', prom)
+        self.assertEqual(metrics.get_records(), [])
+
+    def test_records_from_previous_run_are_dropped(self):
+        """reset の後に記録された前の実行の区間やカウンターが捨てられることをテストします。"""
+        late_span = metrics.start_span("gemini.generate_content")
+        previous_run = metrics.current_run()
+        metrics.reset()
+
+        metrics.end_span(late_span)
+        thread = threading.Thread(
+            target=lambda: (metrics.bind_run(previous_run), metrics.increment("late"))
+        )
+        thread.start()
+        thread.join()
+        metrics.increment("current")
+
+        self.assertEqual(metrics.get_records(), [])
+        self.assertEqual(metrics.get_counters(), {("current", ""): 1})
+
+    def test_summarize_history_percentiles(self):
+        """履歴から処理段階ごとの p50 / p95 が計算されることをテストします。"""
+        path = os.path.join(self.tmpdir, "runs.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for duration in range(1, 101):
+                f.write(json.dumps({"stage": "main.total", "duration_ms": duration}) + "\n")
+
+        summary = metrics.summarize_history(path)
+
+        self.assertEqual(summary["main.total"], {"count": 100, "p50_ms": 50, "p95_ms": 95})
+
+    def test_summarize_history_without_file(self):
+        """履歴のファイルがない場合やパスが未設定の場合に、空の集計が返ることをテストします。"""
+        self.assertEqual(metrics.summarize_history(os.path.join(self.tmpdir, "none.jsonl")), {})
+        self.assertEqual(metrics.summarize_history(""), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
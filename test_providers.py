@@ -0,0 +1,25 @@
+import unittest
+from unittest.mock import MagicMock
+
+import providers
+
+
+class TestGetProvider(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(providers._factories.pop, "test_client", None)
+        self.addCleanup(providers._instances.pop, "test_client", None)
+
+    def test_none_is_not_cached(self):
+        """生成関数が None を返した場合は保持されず、次回の呼び出しで作り直されることをテストします。"""
+        client = object()
+        factory = MagicMock(side_effect=[None, client])
+        providers.register_provider("test_client", factory)
+
+        self.assertIsNone(providers.get_provider("test_client"))
+        self.assertIs(providers.get_provider("test_client"), client)
+        self.assertIs(providers.get_provider("test_client"), client)
+        self.assertEqual(factory.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
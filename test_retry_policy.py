@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from retry_policy import (
+    CircuitBreaker,
+    Deadline,
+    RetryPolicy,
+    call_with_retry,
+    is_safe_to_resend,
+    is_transient_error,
+)
+
+
+class TransientError(Exception):
+    code = 503
+
+
+class FatalError(Exception):
+    code = 400
+
+
+class TestCallWithRetry(unittest.TestCase):
+    def setUp(self):
+        self.sleep = MagicMock()
+        self.policy = RetryPolicy(max_attempts=3, base_delay=1.0, jitter=0.0)
+
+    def test_retries_transient_error(self):
+        """一時的なエラーは指数バックオフで再試行されることをテストします。"""
+        func = MagicMock(side_effect=[TransientError(), TransientError(), "成功"])
+
+        result = call_with_retry(func, self.policy, deadline=Deadline(None), sleep=self.sleep)
+
+        self.assertEqual(result, "成功")
+        self.assertEqual([c.args[0] for c in self.sleep.call_args_list], [1.0, 2.0])
+
+    def test_fatal_error_is_not_retried(self):
+        """再試行できないエラーは1回で送出されることをテストします。"""
+        func = MagicMock(side_effect=FatalError())
+
+        with self.assertRaises(FatalError):
+            call_with_retry(func, self.policy, deadline=Deadline(None), sleep=self.sleep)
+
+        func.assert_called_once()
+        self.sleep.assert_not_called()
+
+    def test_deadline_stops_retry(self):
+        """待ち時間が締め切りまでの残り時間を超える場合は再試行しないことをテストします。"""
+        func = MagicMock(side_effect=TransientError())
+
+        with self.assertRaises(TransientError):
+            call_with_retry(func, self.policy, deadline=Deadline(0.5), sleep=self.sleep)
+
+        func.assert_called_once()
+
+
+class TestIsSafeToResend(unittest.TestCase):
+    def test_only_errors_before_sending_are_resent(self):
+        """POSTの再送は接続前のエラーと一時的なステータスだけに限られることをテストします。"""
+        self.assertTrue(is_safe_to_resend(requests.exceptions.ConnectTimeout()))
+        self.assertTrue(is_safe_to_resend(TransientError()))
+        for error in (
+            requests.exceptions.ReadTimeout(),
+            requests.exceptions.ChunkedEncodingError(),
+        ):
+            with self.subTest(error=type(error).__name__):
+                self.assertTrue(is_transient_error(error))
+                self.assertFalse(is_safe_to_resend(error))
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, "circuit.json")
+
+    def test_opens_after_threshold_and_resets_on_success(self):
+        """失敗がしきい値に達すると閉じ、成功で元に戻ることをテストします。"""
+        breaker = CircuitBreaker(self.path, failure_threshold=2, cooldown_seconds=60)
+
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        # 状態はファイルに保存されるので、別インスタンス (次回の実行) でも有効
+        self.assertFalse(CircuitBreaker(self.path, 2, 60).allow())
+
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+
+    def test_half_open_after_cooldown(self):
+        """冷却期間が過ぎると再び試行が許されることをテストします。"""
+        breaker = CircuitBreaker(self.path, failure_threshold=1, cooldown_seconds=60)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        with patch("retry_policy.time.time", return_value=10**10):
+            self.assertTrue(breaker.allow())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import datetime
+import unittest
+from unittest.mock import MagicMock
+
+from scheduler import ReportSchedule, parse_report_schedules, run_daemon
+
+UTC = datetime.timezone.utc
+
+
+class FakeClock:
+    """sleep した分だけ進む時計。"""
+
+    def __init__(self, now: datetime.datetime) -> None:
+        self.current = now
+
+    def now(self) -> datetime.datetime:
+        return self.current
+
+    def sleep(self, seconds: float) -> None:
+        self.current += datetime.timedelta(seconds=seconds)
+
+
+class TestReportSchedule(unittest.TestCase):
+    def test_next_run_uses_local_time_and_weekdays(self):
+        """次の実行日時がスケジュールの現地時刻と曜日で計算されることをテストします。"""
+        schedule = ReportSchedule("tokyo_close", datetime.time(15, 45), "Asia/Tokyo")
+
+        # 金曜 16:00 JST (07:00 UTC) の次は月曜 15:45 JST
+        run_at = schedule.next_run_after(datetime.datetime(2024, 5, 10, 7, 0, tzinfo=UTC))
+
+        self.assertEqual(run_at.isoformat(), "2024-05-13T15:45:00+09:00")
+
+    def test_parse_report_schedules(self):
+        """スケジュール設定が読み込まれ、不正な項目は読み飛ばされることをテストします。"""
+        raw = (
+            '[{"name": "tokyo_close", "time": "15:45", "timezone": "Asia/Tokyo",'
+            ' "prompt": "tokyo_close", "instruments": ["usdjpy", "nikkei225"]},'
+            ' {"name": "bad_zone", "time": "16:30", "timezone": "Nowhere/City"},'
+            ' {"name": "no_time"}]'
+        )
+
+        schedules = parse_report_schedules(raw)
+
+        self.assertEqual([s.name for s in schedules], ["tokyo_close"])
+        # 指標は MARKET_INSTRUMENTS の並びになる
+        self.assertEqual(
+            [item[0] for item in schedules[0].market_instruments], ["nikkei225", "usdjpy"]
+        )
+        self.assertIn("東京市場サマリー", schedules[0].prompt_template)
+
+
+class TestRunDaemon(unittest.TestCase):
+    def test_runs_schedules_in_time_order(self):
+        """複数のスケジュールが時刻順に実行され、エラーがあっても常駐が続くことをテストします。"""
+        clock = FakeClock(datetime.datetime(2024, 5, 13, 0, 0, tzinfo=UTC))
+        tokyo = ReportSchedule("tokyo_close", datetime.time(15, 45), "Asia/Tokyo")
+        new_york = ReportSchedule("us_close", datetime.time(16, 30), "America/New_York")
+        run_report = MagicMock(side_effect=[RuntimeError("失敗"), None, None])
+
+        run_daemon(
+            [new_york, tokyo], run_report, max_runs=3, now=clock.now, sleep=clock.sleep
+        )
+
+        calls = [(c.args[0].name, c.args[1].isoformat()) for c in run_report.call_args_list]
+        self.assertEqual(
+            calls,
+            [
+                ("tokyo_close", "2024-05-13T15:45:00+09:00"),
+                ("us_close", "2024-05-13T16:30:00-04:00"),
+                ("tokyo_close", "2024-05-14T15:45:00+09:00"),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import datetime
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+
+from yfinance_handler import (
+    calculate_change_percent,
+    get_close_prices_yfinance,
+    get_summary_from_yfinance,
+)
+
+
+def make_download_frame(closes: dict[str, list[float | None]]) -> pd.DataFrame:
+    """yf.download(group_by="column") と同じ形 (列が (項目, ティッカー)) のDataFrameを作るヘルパー。"""
+    periods = len(next(iter(closes.values())))
+    index = pd.date_range(end=datetime.date.today(), periods=periods)
+    columns = pd.MultiIndex.from_product([["Close", "Open"], list(closes)])
+    frame = pd.DataFrame(index=index, columns=columns, dtype=float)
+    for ticker, values in closes.items():
+        frame[("Close", ticker)] = values
+        frame[("Open", ticker)] = values
+    return frame
+
+
+class TestYfinanceHandler(unittest.TestCase):
+    def setUp(self):
+        # 価格キャッシュの影響を受けないように無効化しておく
+        patcher = patch("yfinance_handler.YFINANCE_CACHE_ENABLED", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch("yfinance.download")
+    def test_batched_fetch_single_call(self, mock_download):
+        """複数ティッカーが1回のダウンロードでまとめて取得されることをテストします。"""
+        mock_download.return_value = make_download_frame(
+            {
+                "^GSPC": [5000.0, None, 5100.0],
+                "BTC-USD": [60000.0, 61000.0, 63000.0],
+            }
+        )
+
+        prices = get_close_prices_yfinance(["^GSPC", "BTC-USD"])
+
+        mock_download.assert_called_once()
+        # 欠損を除いた末尾2件が (直近終値, 前日終値) になる
+        self.assertEqual(prices["^GSPC"], (5100.0, 5000.0))
+        self.assertEqual(prices["BTC-USD"], (63000.0, 61000.0))
+
+    @patch("yfinance.download")
+    def test_missing_ticker_returns_none(self, mock_download):
+        """レスポンスに含まれないティッカーは (None, None) になることをテストします。"""
+        mock_download.return_value = make_download_frame({"^GSPC": [5000.0, 5100.0]})
+
+        prices = get_close_prices_yfinance(["^GSPC", "^N225"])
+
+        self.assertEqual(prices["^N225"], (None, None))
+
+    @patch("yfinance.download")
+    def test_download_error_returns_none(self, mock_download):
+        """ダウンロード中の例外は握りつぶされ、全ティッカーが None になることをテストします。"""
+        mock_download.side_effect = Exception("ネットワークエラー")
+
+        prices = get_close_prices_yfinance(["^GSPC"])
+
+        self.assertEqual(prices, {"^GSPC": (None, None)})
+
+    def test_calculate_change_percent(self):
+        """騰落率の計算と、計算できないケースをテストします。"""
+        self.assertAlmostEqual(calculate_change_percent(110.0, 100.0), 10.0)
+        self.assertIsNone(calculate_change_percent(None, 100.0))
+        self.assertIsNone(calculate_change_percent(110.0, None))
+
+    @patch("yfinance_handler.get_close_frame_yfinance")
+    def test_summary_renders_all_instruments(self, mock_frame):
+        """サマリーに全指標が前日比と追加の指標付きで含まれることをテストします。"""
+        mock_frame.return_value = pd.DataFrame(
+            {"^GSPC": [5000.0, 5100.0]},
+            index=[datetime.date(2024, 5, 9), datetime.date(2024, 5, 10)],
+        )
+
+        summary = get_summary_from_yfinance()
+
+        self.assertIn("S&P 500 前日終値: $5,100.00 (前日比 +2.00%)", summary)
+        self.assertIn("52週高値比 +0.00%", summary)
+        self.assertIn("日経平均 前日終値: N/A", summary)
+        self.assertIn("銀 (先物)", summary)
+
+
+class TestYfinancePriceCache(unittest.TestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        for patcher in (
+            patch("yfinance_handler.YFINANCE_CACHE_ENABLED", True),
+            patch("yfinance_handler.CACHE_DIR", tmpdir.name),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch("yfinance.download")
+    def test_cache_hit_skips_download(self, mock_download):
+        """TTL内の2回目の取得ではダウンロードが行われないことをテストします。"""
+        mock_download.return_value = make_download_frame({"^GSPC": [5000.0, 5100.0]})
+
+        first = get_close_prices_yfinance(["^GSPC"])
+        second = get_close_prices_yfinance(["^GSPC"])
+
+        mock_download.assert_called_once()
+        self.assertEqual(first, second)
+        self.assertEqual(second["^GSPC"], (5100.0, 5000.0))
+
+    @patch("yfinance.download")
+    def test_stale_cache_fetches_incrementally(self, mock_download):
+        """TTL切れの場合、キャッシュ済みの最新バー以降だけが取得されることをテストします。"""
+        mock_download.return_value = make_download_frame(
+            {"^GSPC": [4900.0, 5000.0, 5100.0]}
+        )
+        get_close_prices_yfinance(["^GSPC"])
+
+        mock_download.return_value = make_download_frame({"^GSPC": [5200.0]})
+        with patch("yfinance_handler.YFINANCE_CACHE_TTL_MINUTES", 0):
+            prices = get_close_prices_yfinance(["^GSPC"])
+
+        _, kwargs = mock_download.call_args
+        self.assertEqual(kwargs["start"], datetime.date.today().isoformat())
+        # 当日バーは新しい値で上書きされ、前日分はキャッシュから補われる
+        self.assertEqual(prices["^GSPC"], (5200.0, 5000.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
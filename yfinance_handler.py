@@ -1,19 +1,160 @@
-def get_close_price_yfinance(ticker: str) -> float | None:
-    """指定されたティッカーの終値をyfinanceで取得する関数"""
+import datetime
+import math
+import os
+
+from config import (
+    CACHE_DIR,
+    YFINANCE_CACHE_ENABLED,
+    YFINANCE_CACHE_RETENTION_DAYS,
+    YFINANCE_CACHE_TTL_MINUTES,
+    YFINANCE_INDICATOR_LOOKBACK_DAYS,
+    MARKET_INSTRUMENTS,
+)
+import metrics
+from indicators import compute_indicators, format_indicators
+from price_cache import PriceCache
+from providers import get_provider
+
+
+def _download_closes_yfinance(tickers: list[str], start: datetime.date):
+    """指定日以降の終値を1回のyf.download呼び出しでまとめて取得し、
+    (日付 x ティッカー) のDataFrameで返す関数。取得できなければ None。"""
     try:
-        import yfinance as yf  # 関数内インポート
+        yf = get_provider("yfinance")  # 初回利用時にインポートされる
 
-        data = yf.download(ticker, period="1d", auto_adjust=False)
+        with metrics.span("yfinance.download", tickers=len(tickers)):
+            data = yf.download(
+                tickers,
+                start=start.isoformat(),
+                auto_adjust=False,
+                group_by="column",
+                progress=False,
+            )
         if data is None or data.empty:
-            print(f"yfinance: {ticker} のデータが空です。")
+            print(f"yfinance: {', '.join(tickers)} のデータが空です。")
             return None
-        last_price = data["Close"].iloc[-1]
-        return round(float(last_price), 2)
+        closes = data["Close"]
+        if not hasattr(closes, "columns"):
+            # 古いyfinanceでは単一ティッカーの場合にSeriesが返る
+            closes = closes.to_frame(name=tickers[0])
+        closes.index = [timestamp.date() for timestamp in closes.index]
+        return closes
+    except Exception as e:
+        print(f"yfinance: {', '.join(tickers)} データ取得エラー: {str(e)}")
+        return None
+
+
+def _open_price_cache() -> PriceCache | None:
+    if not YFINANCE_CACHE_ENABLED:
+        return None
+    try:
+        return PriceCache(os.path.join(CACHE_DIR, "prices.sqlite3"))
     except Exception as e:
-        print(f"yfinance: {ticker} データ取得エラー: {str(e)}")
+        print(f"yfinance: 価格キャッシュを開けませんでした: {e}")
         return None
 
 
+def get_close_frame_yfinance(tickers: list[str], days: int):
+    """直近 days 日分の終値を (日付 x ティッカー) のDataFrameで返す関数。
+
+    キャッシュが有効な場合、TTL内のティッカーはダウンロードせず、期限切れのティッカーも
+    キャッシュ済みの最新バー以降だけをまとめて取得する。
+    """
+    pd = get_provider("pandas")  # 初回利用時にインポートされる
+
+    since = datetime.date.today() - datetime.timedelta(days=days)
+    cache = _open_price_cache()
+    if cache is None:
+        closes = _download_closes_yfinance(tickers, since)
+        if closes is None:
+            return pd.DataFrame(columns=tickers, dtype=float)
+        return closes.reindex(columns=tickers)
+
+    try:
+        ttl_seconds = YFINANCE_CACHE_TTL_MINUTES * 60
+        stale: list[str] = []
+        fetch_since = datetime.date.today()
+        for ticker in tickers:
+            covered_since = cache.covered_since(ticker)
+            last_date = cache.last_date(ticker)
+            if covered_since is None or covered_since > since or last_date is None:
+                # 必要な期間をカバーしていなければ期間全体を取得する
+                stale.append(ticker)
+                fetch_since = min(fetch_since, since)
+            elif not cache.is_fresh(ticker, ttl_seconds):
+                # 最新バーは取引時間中の値の可能性があるため、その日から取り直す
+                stale.append(ticker)
+                fetch_since = min(fetch_since, last_date)
+
+        metrics.increment("yfinance_cache", len(tickers) - len(stale), label="hit")
+        metrics.increment("yfinance_cache", len(stale), label="miss")
+        if stale:
+            print(
+                f"yfinance: {len(stale)}/{len(tickers)} ティッカーを {fetch_since} 以降で更新します。"
+            )
+            closes = _download_closes_yfinance(stale, fetch_since)
+            if closes is not None:
+                for ticker in stale:
+                    if ticker not in closes.columns:
+                        continue
+                    series = closes[ticker].dropna()
+                    cache.store(
+                        ticker,
+                        [(date, float(close)) for date, close in series.items()],
+                        fetch_since,
+                    )
+            cache.evict(YFINANCE_CACHE_RETENTION_DAYS)
+        else:
+            print("yfinance: 全ティッカーがキャッシュから取得できました。")
+
+        frame = pd.DataFrame(
+            {
+                ticker: pd.Series(dict(cache.load(ticker, since)), dtype=float)
+                for ticker in tickers
+            }
+        )
+        return frame.sort_index()
+    finally:
+        cache.close()
+
+
+def get_close_prices_yfinance(
+    tickers: list[str],
+) -> dict[str, tuple[float | None, float | None]]:
+    """複数ティッカーの直近2営業日分の終値をまとめて取得する関数。
+
+    戻り値は {ティッカー: (直近終値, その前の終値)}。取得できなかった値は None。
+    """
+    prices: dict[str, tuple[float | None, float | None]] = {
+        ticker: (None, None) for ticker in tickers
+    }
+    if not tickers:
+        return prices
+
+    # 連休を挟んでも2営業日分が取れるように、期間は余裕を持たせる
+    with metrics.span("yfinance.get_close_prices", tickers=len(tickers)):
+        closes = get_close_frame_yfinance(tickers, days=10)
+    for ticker in tickers:
+        if ticker not in closes.columns:
+            print(f"yfinance: {ticker} のデータが見つかりません。")
+            continue
+        # 暗号資産は土日も値が付くため、ティッカーごとに欠損を除いてから末尾2件を取る
+        series = closes[ticker].dropna()
+        if series.empty:
+            print(f"yfinance: {ticker} のデータが空です。")
+            continue
+        last_price = round(float(series.iloc[-1]), 4)
+        previous_price = round(float(series.iloc[-2]), 4) if len(series) >= 2 else None
+        prices[ticker] = (last_price, previous_price)
+    return prices
+
+
+def get_close_price_yfinance(ticker: str) -> float | None:
+    """指定されたティッカーの終値をyfinanceで取得する関数"""
+    last_price, _ = get_close_prices_yfinance([ticker])[ticker]
+    return round(last_price, 2) if last_price is not None else None
+
+
 def get_sp500_close_yfinance() -> float | None:
     return get_close_price_yfinance("^GSPC")
 
@@ -22,20 +163,57 @@ def get_nikkei225_close_yfinance() -> float | None:
     return get_close_price_yfinance("^N225")
 
 
-def format_price_yfinance(label: str, price: float | None, currency_symbol: str) -> str:
+def calculate_change_percent(
+    price: float | None, previous_price: float | None
+) -> float | None:
+    """前日比の騰落率(%)を計算する関数。計算できない場合は None を返す。"""
+    if price is None or not previous_price:
+        return None
+    return (price - previous_price) / previous_price * 100
+
+
+def format_price_yfinance(
+    label: str,
+    price: float | None,
+    currency_symbol: str,
+    previous_price: float | None = None,
+    decimals: int = 2,
+) -> str:
     """価格情報をフォーマットするヘルパー関数 (yfinance版)"""
-    if price is not None:
-        return f"📈 {label} 前日終値: {currency_symbol}{price:,}\\n"
-    else:
-        return f"📈 {label} 前日終値: N/A\\n"
+    if price is None:
+        return f"📈 {label} 前日終値: N/A\n"
+    change = calculate_change_percent(price, previous_price)
+    change_text = f"{change:+.2f}%" if change is not None else "N/A"
+    return f"📈 {label} 前日終値: {currency_symbol}{price:,.{decimals}f} (前日比 {change_text})\n"
+
+
+def _to_optional_float(value) -> float | None:
+    return None if value is None or math.isnan(value) else round(float(value), 4)
+
 
+def get_summary_from_yfinance(instruments: list[tuple] = MARKET_INSTRUMENTS) -> str:
+    """市場データをyfinanceで取得して、Discord用にテキストフォーマットする関数
 
-def get_summary_from_yfinance() -> str:
-    """市場データをyfinanceで取得して、Discord用にテキストフォーマットする関数"""
-    sp500_price: float | None = get_sp500_close_yfinance()
-    nikkei_price: float | None = get_nikkei225_close_yfinance()
+    YFINANCE_INDICATOR_LOOKBACK_DAYS 日分の終値から、全指標の週次・月次騰落率、
+    移動平均乖離率、ボラティリティ、52週高安値からの距離をまとめて計算して添える。
+    """
+    tickers = [ticker for _, _, ticker, _, _ in instruments]
+    with metrics.span("yfinance.get_close_frame", tickers=len(tickers)):
+        closes = get_close_frame_yfinance(tickers, days=YFINANCE_INDICATOR_LOOKBACK_DAYS)
+    with metrics.span("yfinance.indicators", tickers=len(tickers)):
+        indicators = compute_indicators(closes.reindex(columns=tickers))
 
-    message: str = "yfinanceによる代替情報:\\n"
-    message += format_price_yfinance("S&P 500", sp500_price, "$")
-    message += format_price_yfinance("日経平均", nikkei_price, "¥")
+    message: str = "yfinanceによる代替情報:\n"
+    for _, label, ticker, currency_symbol, decimals in instruments:
+        row = indicators.loc[ticker]
+        price = _to_optional_float(row["close"])
+        message += format_price_yfinance(
+            label,
+            price,
+            currency_symbol,
+            _to_optional_float(row["previous_close"]),
+            decimals,
+        )
+        if price is not None:
+            message += format_indicators(row)
     return message